@@ -0,0 +1,156 @@
+"""
+Local stand-in for the parts of the Ollama API JellySeek uses, with
+deterministic embeddings and configurable latency.
+
+    python benchmarks/fake_ollama.py --port 11435 --embed-latency 0.02 --token-latency 0.01
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = (
+    "Based on your library, the best fit is the first movie in the context. "
+    "It matches the genre and era you asked for and has strong reviews."
+).split(" ")
+
+class FakeOllama:
+    def __init__(self, dimensions: int = 384, embed_latency: float = 0.0, embed_item_latency: float = 0.0,
+                 first_token_latency: float = 0.0, token_latency: float = 0.0):
+        self.dimensions = dimensions
+        self.embed_latency = embed_latency
+        self.embed_item_latency = embed_item_latency
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.counters = {"embed_requests": 0, "embedded_texts": 0, "generate_requests": 0}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def vector(self, text: str):
+        """Unit-length vector seeded by the text, identical across runs"""
+        rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+        values = [rng.gauss(0, 1) for _ in range(self.dimensions)]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def embed(self, texts):
+        self.count("embed_requests")
+        self.count("embedded_texts", len(texts))
+        time.sleep(self.embed_latency + self.embed_item_latency * len(texts))
+        return [self.vector(t) for t in texts]
+
+    def tokens(self):
+        self.count("generate_requests")
+        time.sleep(self.first_token_latency)
+        for index, word in enumerate(ANSWER):
+            if index:
+                time.sleep(self.token_latency)
+            yield word if index == len(ANSWER) - 1 else word + " "
+
+def make_handler(ollama: FakeOllama):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, payload, status: int = 200):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_chunk(self, payload):
+            data = (json.dumps(payload) + "\n").encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                return self.send_json({"models": []})
+            if self.path == "/api/version":
+                return self.send_json({"version": "0.0.0-fake"})
+            if self.path == "/stats":
+                return self.send_json(ollama.counters)
+            self.send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            model = body.get("model", "fake")
+
+            if self.path == "/api/embed":
+                texts = body.get("input", [])
+                texts = [texts] if isinstance(texts, str) else texts
+                return self.send_json({"model": model, "embeddings": ollama.embed(texts)})
+            if self.path == "/api/embeddings":
+                return self.send_json({"embedding": ollama.embed([body.get("prompt", "")])[0]})
+            if self.path in ("/api/generate", "/api/chat"):
+                return self.generate(body, model, chat=self.path == "/api/chat")
+            self.send_json({"error": "not found"}, 404)
+
+        def generate(self, body: dict, model: str, chat: bool):
+            # One token per word, appended to the context tokens of earlier turns
+            prompt_tokens = len(body.get("prompt", "").split())
+            context = list(body.get("context") or []) + [0] * (prompt_tokens + len(ANSWER))
+
+            def message(text: str, done: bool) -> dict:
+                payload = {"model": model, "done": done}
+                if chat:
+                    payload["message"] = {"role": "assistant", "content": text}
+                else:
+                    payload["response"] = text
+                if done:
+                    payload.update(done_reason="stop", context=context, prompt_eval_count=prompt_tokens, eval_count=len(ANSWER))
+                return payload
+
+            if not body.get("stream", True):
+                return self.send_json(message("".join(ollama.tokens()), True))
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in ollama.tokens():
+                self.send_chunk(message(token, False))
+            self.send_chunk(message("", True))
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+def serve(host: str, port: int, ollama: FakeOllama) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), make_handler(ollama))
+    server.daemon_threads = True
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Seconds per embedding request")
+    parser.add_argument("--embed-item-latency", type=float, default=0.0, help="Extra seconds per embedded text")
+    parser.add_argument("--first-token-latency", type=float, default=0.0, help="Seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds between tokens")
+    args = parser.parse_args()
+
+    ollama = FakeOllama(args.dimensions, args.embed_latency, args.embed_item_latency,
+                        args.first_token_latency, args.token_latency)
+    server = serve(args.host, args.port, ollama)
+    print(f"Fake Ollama listening on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Offline benchmark suite. For each library size it generates a synthetic
+export, starts the fake Ollama server and times load_movie_json,
+generate_database, query_database and handle_query in a fresh process.
+Throughput, latency percentiles and peak RSS are appended as JSON lines
+so runs can be compared.
+
+    python benchmarks/run.py --sizes 1000 10000 100000 --queries 50 --embed-latency 0.01
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+from synthetic_library import GENRES, TAGS, WORDS, generate_library  # noqa: E402
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def latency_summary(samples) -> dict:
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+def benchmark_questions(count: int, seed: int):
+    rng = random.Random(seed)
+    templates = [
+        "{genre} movies about {tag}",
+        "something {word} with a {tag} from the {decade}s",
+        "{genre} films like {word} {word}",
+        "recommend a {genre} movie about a {word} {word}",
+    ]
+    return [
+        rng.choice(templates).format(
+            genre=rng.choice(GENRES).lower(), tag=rng.choice(TAGS), word=rng.choice(WORDS),
+            decade=rng.choice([70, 80, 90])
+        )
+        for _ in range(count)
+    ]
+
+def run_worker(queries: int, seed: int):
+    """Runs inside a fresh process whose environment points at the benchmark data"""
+    from jellyseek.rag.database import initialize_database, query_database
+    from jellyseek.rag.db_generator import generate_database, items_files, load_movie_json
+    from jellyseek.rag.movie_chat import handle_query
+
+    stages = {}
+    questions = benchmark_questions(queries, seed)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        documents, _, _ = load_movie_json(items_files())
+        elapsed = time.perf_counter() - start
+        stages["load_movie_json"] = {
+            "seconds": elapsed, "items_per_s": len(documents) / elapsed, "peak_rss_mb": peak_rss_mb()
+        }
+        del documents
+
+        start = time.perf_counter()
+        if not generate_database(force_update=True):
+            raise RuntimeError("generate_database failed")
+        elapsed = time.perf_counter() - start
+        _, _, _, collection = initialize_database(verbose=False)
+        stages["generate_database"] = {
+            "seconds": elapsed, "items_per_s": collection.count() / elapsed, "peak_rss_mb": peak_rss_mb()
+        }
+
+        samples = []
+        for question in questions:
+            start = time.perf_counter()
+            query_database(collection, question)
+            samples.append(time.perf_counter() - start)
+        stages["query_database"] = {**latency_summary(samples), "peak_rss_mb": peak_rss_mb()}
+
+        samples = []
+        for question in questions:
+            start = time.perf_counter()
+            handle_query(question, collection)
+            samples.append(time.perf_counter() - start)
+        stages["handle_query"] = {**latency_summary(samples), "peak_rss_mb": peak_rss_mb()}
+
+    print(json.dumps(stages))
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=BENCHMARKS_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_size(size: int, args) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix=f"jellyseek-bench-{size}-"))
+    port = free_port()
+    ollama = subprocess.Popen(
+        [sys.executable, str(BENCHMARKS_DIR / "fake_ollama.py"), "--port", str(port),
+         "--dimensions", str(args.dimensions),
+         "--embed-latency", str(args.embed_latency),
+         "--embed-item-latency", str(args.embed_item_latency),
+         "--first-token-latency", str(args.first_token_latency),
+         "--token-latency", str(args.token_latency)],
+        stdout=subprocess.PIPE, text=True
+    )
+    try:
+        ollama.stdout.readline()  # wait until it is listening
+        generate_library(size, workdir / "data" / "jellyfin_items.jsnap", args.seed)
+        env = {
+            **os.environ,
+            "OLLAMA_BASE_URL": f"http://127.0.0.1:{port}",
+            "CHROMADB_PATH": str(workdir / "chromadb"),
+            "JELLYFIN_DATA_PATH": str(workdir / "data"),
+            "JELLYFIN_SERVER_URL": "http://127.0.0.1:1",
+            "JELLYFIN_SERVER_API_KEY": "benchmark",
+            "ANSWER_CACHE_SIZE": "0",
+            "STREAM_RESPONSES": "false",
+            "ANONYMIZED_TELEMETRY": "False",
+        }
+        worker = subprocess.run(
+            [sys.executable, __file__, "--worker", "--queries", str(args.queries), "--seed", str(args.seed)],
+            env=env, capture_output=True, text=True
+        )
+        if worker.returncode != 0:
+            raise RuntimeError(f"Benchmark worker failed for {size} items:\n{worker.stderr}")
+        stages = json.loads(worker.stdout.strip().splitlines()[-1])
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats") as response:
+            ollama_calls = json.load(response)
+    finally:
+        ollama.terminate()
+        ollama.wait()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "benchmark": "rag",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "size": size,
+        "queries": args.queries,
+        "fake_ollama": {
+            "dimensions": args.dimensions,
+            "embed_latency": args.embed_latency,
+            "embed_item_latency": args.embed_item_latency,
+            "first_token_latency": args.first_token_latency,
+            "token_latency": args.token_latency,
+            "calls": ollama_calls,
+        },
+        "stages": stages,
+    }
+
+def print_record(record: dict):
+    print(f"\n{record['size']} titles ({record['revision']})")
+    for name, stage in record["stages"].items():
+        if "items_per_s" in stage:
+            detail = f"{stage['seconds']:.2f}s  {stage['items_per_s']:.0f} items/s"
+        else:
+            detail = f"p50 {stage['p50_ms']:.1f}ms  p95 {stage['p95_ms']:.1f}ms"
+        print(f"  {name:<18} {detail:<36} peak RSS {stage['peak_rss_mb']:.0f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--embed-item-latency", type=float, default=0.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.0)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--results", default=str(BENCHMARKS_DIR / "results" / "benchmarks.jsonl"))
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary benchmark directories")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.queries, args.seed)
+        return
+
+    Path(args.results).parent.mkdir(parents=True, exist_ok=True)
+    for size in args.sizes:
+        record = run_size(size, args)
+        with open(args.results, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        print_record(record)
+    print(f"\nResults appended to {args.results}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Cold-start benchmark: time from launching `python -m jellyseek` until the
+chat prompt is printed. Results are appended as JSON lines so regressions
+are easy to spot between runs.
+
+    python benchmarks/startup.py --runs 5 --results benchmarks/results/startup.jsonl
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROMPT = b"Enter your question about movies:"
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def time_to_prompt(timeout: float) -> float:
+    """Launch the chat, wait for the prompt, then quit. Returns seconds to prompt"""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "jellyseek"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        env={**os.environ, "PYTHONUNBUFFERED": "1"}
+    )
+    output = b""
+    try:
+        # The prompt has no trailing newline, so read what is available
+        while PROMPT not in output:
+            chunk = proc.stdout.read1(4096)
+            if not chunk:
+                raise RuntimeError(f"jellyseek exited before showing the prompt:\n{output.decode(errors='replace')}")
+            output += chunk
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"No prompt after {timeout}s")
+        elapsed = time.perf_counter() - start
+        proc.stdin.write(b"/quit\n")
+        proc.stdin.flush()
+        proc.wait(timeout=timeout)
+        return elapsed
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--results", default=str(Path(__file__).resolve().parent / "results" / "startup.jsonl"))
+    args = parser.parse_args()
+
+    timings = [time_to_prompt(args.timeout) for _ in range(args.runs)]
+    record = {
+        "benchmark": "startup",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "runs": args.runs,
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "max_s": max(timings),
+    }
+    Path(args.results).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.results, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+    print(f"time to first prompt over {args.runs} runs: "
+          f"min {record['min_s']:.3f}s  median {record['median_s']:.3f}s  max {record['max_s']:.3f}s")
+    print(f"Results appended to {args.results}")
+
+if __name__ == "__main__":
+    main()
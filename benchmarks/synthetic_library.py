@@ -0,0 +1,68 @@
+"""
+Generate a synthetic Jellyfin export in the snapshot format written by
+save_items, so benchmarks run without a Jellyfin server.
+
+    python benchmarks/synthetic_library.py 10000 /tmp/jellyseek-bench/data/jellyfin_items.jsnap
+"""
+import argparse
+import random
+from pathlib import Path
+from jellyseek.jellyfin_export.snapshot import write_snapshot
+
+GENRES = [
+    "Action", "Adventure", "Animation", "Comedy", "Crime", "Documentary", "Drama",
+    "Family", "Fantasy", "History", "Horror", "Music", "Mystery", "Romance",
+    "Science Fiction", "Thriller", "War", "Western",
+]
+TAGS = [
+    "island", "escape", "heist", "space", "alien", "robot", "time travel", "revenge",
+    "dystopia", "road trip", "haunted house", "serial killer", "friendship", "zombie",
+    "dinosaur", "submarine", "small town", "coming of age", "based on novel", "sequel",
+]
+OFFICIAL_RATINGS = ["G", "PG", "PG-13", "R", "NC-17", None]
+FIRST_NAMES = ["Anna", "Ben", "Chloe", "David", "Elena", "Frank", "Grace", "Hugo", "Iris", "Jack", "Kate", "Leo"]
+LAST_NAMES = ["Smith", "Garcia", "Chen", "Novak", "Okafor", "Rossi", "Silva", "Tanaka", "Weber", "Young"]
+WORDS = (
+    "a an the young old detective crew family city planet ship town secret war love "
+    "mission journey night storm mystery past future machine island friend enemy "
+    "team must find stop escape save discover survive hunt uncover protect before "
+    "after when while dangerous hidden lost last first final strange deadly"
+).split()
+
+def synthetic_item(rng: random.Random, index: int) -> dict:
+    title = " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(1, 4)))
+    item = {
+        "Name": f"{title} {index}",
+        "Id": f"{rng.getrandbits(128):032x}",
+        "Type": "Movie",
+        "IsFolder": False,
+        "Overview": " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 90))).capitalize() + ".",
+        "Genres": rng.sample(GENRES, rng.randint(1, 3)),
+        "Tags": rng.sample(TAGS, rng.randint(0, 5)),
+        "Actors": [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(rng.randint(0, 8))],
+        "CriticRating": rng.randint(10, 100) if rng.random() < 0.8 else None,
+        "CommunityRating": round(rng.uniform(3, 9.5), 1),
+        "OfficialRating": rng.choice(OFFICIAL_RATINGS),
+        "RunTimeTicks": rng.randint(75, 200) * 600_000_000,
+    }
+    if rng.random() < 0.97:
+        item["PremiereDate"] = f"{rng.randint(1930, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00.0000000Z"
+    return item
+
+def generate_library(count: int, path: Path, seed: int = 0) -> Path:
+    """Write count deterministic movie items as a library snapshot"""
+    rng = random.Random(seed)
+    write_snapshot((synthetic_item(rng, index) for index in range(count)), path)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("count", type=int)
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_library(args.count, args.path, args.seed)
+    print(f"Wrote {args.count} items to {args.path}")
+
+if __name__ == "__main__":
+    main()
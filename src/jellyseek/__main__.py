@@ -1,7 +1,29 @@
-from jellyseek.rag.movie_chat import chat_loop
+import argparse
 
 def main():
-    chat_loop()
+    parser = argparse.ArgumentParser(prog="jellyseek", description="AI movie recommendations from your Jellyfin library")
+    subcommands = parser.add_subparsers(dest="command")
+    subcommands.add_parser("chat", help="Interactive chat (default)")
+
+    batch = subcommands.add_parser("batch", help="Answer questions from a JSONL file without the chat")
+    batch.add_argument("input", nargs="?", default="-", help="JSONL file with one question per line (default: stdin)")
+    batch.add_argument("-o", "--output", default="-", help="Where to write JSONL results (default: stdout)")
+    batch.add_argument("-w", "--workers", type=int, help="Number of parallel workers (default: BATCH_WORKERS)")
+
+    serve = subcommands.add_parser("serve", help="Run a local HTTP query service")
+    serve.add_argument("--host", help="Address to listen on (default: SERVE_HOST)")
+    serve.add_argument("--port", type=int, help="Port to listen on (default: SERVE_PORT)")
+
+    args = parser.parse_args()
+    if args.command == "batch":
+        from jellyseek.rag.batch import run_batch
+        run_batch(args.input, args.output, args.workers)
+    elif args.command == "serve":
+        from jellyseek.rag.server import serve
+        serve(args.host, args.port)
+    else:
+        from jellyseek.rag.movie_chat import chat_loop
+        chat_loop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -13,13 +13,30 @@ DEFAULT_DATA_PATH = os.path.join(os.path.expanduser("~"), ".local", "share", "je
 raw_path = os.getenv("JELLYFIN_DATA_PATH", DEFAULT_DATA_PATH)
 JELLYFIN_DATA_PATH = os.path.expanduser(raw_path)
 
-if not JELLYFIN_URL or not JELLYFIN_API_KEY:
-    raise ValueError("JELLYFIN_SERVER_URL and JELLYFIN_SERVER_API_KEY must be set in the environment variables.")
+# Number of items requested per /Items page
+JELLYFIN_PAGE_SIZE = int(os.getenv("JELLYFIN_PAGE_SIZE", "500"))
 
-# Create data directory if it doesn't exist
-try:
-    os.makedirs(JELLYFIN_DATA_PATH, exist_ok=True)
-except PermissionError:
-    print(f"Warning: Cannot create directory at {JELLYFIN_DATA_PATH}. Check permissions.")
-    JELLYFIN_DATA_PATH = DEFAULT_DATA_PATH
-    os.makedirs(JELLYFIN_DATA_PATH, exist_ok=True)
+# Comma-separated library names to export, empty exports every movie and TV library
+JELLYFIN_LIBRARIES = [name.strip() for name in os.getenv("JELLYFIN_LIBRARIES", "").split(",") if name.strip()]
+# Libraries fetched at the same time
+JELLYFIN_CONCURRENCY = int(os.getenv("JELLYFIN_CONCURRENCY", "4"))
+# Earlier snapshots kept per library for diffs and rollback
+JELLYFIN_SNAPSHOT_HISTORY = int(os.getenv("JELLYFIN_SNAPSHOT_HISTORY", "3"))
+
+def validate_config() -> str:
+    """
+    Check the Jellyfin settings and create the data directory on first use.
+    Returns the data path, which falls back to the default if not writable.
+    """
+    global JELLYFIN_DATA_PATH
+    if not JELLYFIN_URL or not JELLYFIN_API_KEY:
+        raise ValueError("JELLYFIN_SERVER_URL and JELLYFIN_SERVER_API_KEY must be set in the environment variables.")
+
+    # Create data directory if it doesn't exist
+    try:
+        os.makedirs(JELLYFIN_DATA_PATH, exist_ok=True)
+    except PermissionError:
+        print(f"Warning: Cannot create directory at {JELLYFIN_DATA_PATH}. Check permissions.")
+        JELLYFIN_DATA_PATH = DEFAULT_DATA_PATH
+        os.makedirs(JELLYFIN_DATA_PATH, exist_ok=True)
+    return JELLYFIN_DATA_PATH
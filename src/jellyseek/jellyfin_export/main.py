@@ -1,76 +1,303 @@
-from jellyseek.jellyfin_export.config import JELLYFIN_API_KEY, JELLYFIN_URL, JELLYFIN_DATA_PATH
+from jellyseek.jellyfin_export.config import (
+    JELLYFIN_API_KEY, JELLYFIN_URL, JELLYFIN_PAGE_SIZE, JELLYFIN_LIBRARIES, JELLYFIN_CONCURRENCY, validate_config
+)
+from jellyseek.jellyfin_export.snapshot import (
+    SNAPSHOT_SUFFIX, Snapshot, diff_snapshots, iter_snapshot, rollback_snapshot, snapshot_history, trim_item, write_snapshot
+)
+import argparse
+import contextvars
 import requests
 import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
-def get_movies_folder_id():
-    """Get the ID of the Movies folder"""
+ITEMS_FILENAME = f'jellyfin_items{SNAPSHOT_SUFFIX}'
+LIBRARIES_DIRNAME = 'libraries'
+SYNC_STATE_FILENAME = 'sync_state.json'
+SYNC_OVERLAP = timedelta(minutes=5)
+IDS_PER_REQUEST = 100
+ITEM_FIELDS = "Path,Overview,PremiereDate,CriticRating,CommunityRating,OfficialRating,Tags,Genres,Actors"
+
+# Jellyfin library types we know how to index, and the items to request from each
+LIBRARY_ITEM_TYPES = {
+    "movies": "Movie",
+    "tvshows": "Series",
+}
+
+def get_libraries(session) -> List[dict]:
+    """Every movie and TV library on the server, limited to JELLYFIN_LIBRARIES if set"""
     headers = {
         "X-Emby-Token": JELLYFIN_API_KEY
     }
-    
-    response = requests.get(f"{JELLYFIN_URL}/Items", headers=headers)
+
+    response = session.get(f"{JELLYFIN_URL}/Library/VirtualFolders", headers=headers)
     if response.status_code != 200:
-        print(f"Failed to fetch items: {response.status_code} - {response.text}")
-        return None
-        
-    data = response.json()
-    for item in data.get('Items', []):
-        if (item.get('Name') == 'Movies' and 
-            item.get('Type') == 'Folder' and 
-            item.get('IsFolder')):
-            return item.get('Id')
-    
-    return None
-
-def fetch_items():
-    """Fetch all movie items from Jellyfin under the Movies folder"""
-    movies_folder_id = get_movies_folder_id()
-    if not movies_folder_id:
-        print("Could not find Movies folder!")
-        return None
-        
-    print(f"Found Movies folder with ID: {movies_folder_id}")
-    
+        raise RuntimeError(f"Failed to fetch libraries: {response.status_code} - {response.text}")
+
+    wanted = {name.lower() for name in JELLYFIN_LIBRARIES}
+    libraries = []
+    for folder in response.json():
+        item_type = LIBRARY_ITEM_TYPES.get(folder.get('CollectionType'))
+        if not item_type or not folder.get('ItemId'):
+            continue
+        if wanted and folder.get('Name', '').lower() not in wanted:
+            continue
+        libraries.append({"id": folder['ItemId'], "name": folder.get('Name', ''), "item_type": item_type})
+    return libraries
+
+def library_file(data_path, name: str) -> Path:
+    """Snapshot holding one library's items"""
+    filename = re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_") or "library"
+    return Path(data_path) / LIBRARIES_DIRNAME / f"{filename}{SNAPSHOT_SUFFIX}"
+
+def load_sync_state() -> dict:
+    """Libraries seen so far with the time each was last synced"""
+    try:
+        with open(Path(validate_config()) / SYNC_STATE_FILENAME, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_sync_state(state: dict):
+    state_file = Path(validate_config()) / SYNC_STATE_FILENAME
+    tmp_file = state_file.with_suffix('.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_file, state_file)
+
+def iter_pages(session, params: dict, page_size: int = JELLYFIN_PAGE_SIZE):
+    """Yield items from GET /Items one page at a time"""
     headers = {
         "X-Emby-Token": JELLYFIN_API_KEY
     }
-    
+    params = dict(params, Limit=page_size)
+
+    start_index = 0
+    while True:
+        params["StartIndex"] = start_index
+        response = session.get(
+            f"{JELLYFIN_URL}/Items", 
+            headers=headers,
+            params=params
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to fetch items: {response.status_code} - {response.text}")
+
+        page = response.json().get('Items', [])
+        yield from page
+
+        # A short page means we've reached the end of the library
+        if len(page) < page_size:
+            break
+        start_index += len(page)
+
+def library_params(library: dict, **extra) -> dict:
     params = {
-        "ParentId": movies_folder_id,
+        "ParentId": library["id"],
         "Recursive": "true",
-        "IncludeItemTypes": "Movie",
-        "Fields": "Path,Overview,PremiereDate,CriticRating,CommunityRating,OfficialRating,Tags,Genres,Actors",
-        "EnableImages": "false"
+        "IncludeItemTypes": library["item_type"],
+        "Fields": ITEM_FIELDS,
+        "EnableImages": "false",
+        "EnableTotalRecordCount": "false",
+        "SortBy": "SortName",
     }
-    
-    response = requests.get(
-        f"{JELLYFIN_URL}/Items", 
-        headers=headers,
-        params=params
-    )
-    
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Failed to fetch movies: {response.status_code} - {response.text}")
-        return None
-
-def save_items(items):
-    """Save items to JSON file"""
-    output_file = Path(JELLYFIN_DATA_PATH) / 'jellyfin_items.json'
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(items, f, indent=2, ensure_ascii=False)
-    print(f"Data saved to: {output_file}")
+    params.update(extra)
+    return params
+
+def fetch_library(session, library: dict, page_size: int = JELLYFIN_PAGE_SIZE, **extra):
+    """Yield a library's items trimmed to the snapshot fields, tagged with the library they came from"""
+    for item in iter_pages(session, library_params(library, **extra), page_size):
+        item = trim_item(item)
+        item["LibraryId"] = library["id"]
+        item["LibraryName"] = library["name"]
+        yield item
+
+def read_items(path: Path) -> dict:
+    """Items of a previous export keyed by ID, in file order"""
+    return {item.get('Id'): item for item in iter_snapshot(path)}
+
+def sync_library_items(session, library: dict, state: dict, data_path,
+                       page_size: int = JELLYFIN_PAGE_SIZE) -> Tuple[int, bool]:
+    """
+    Bring one library's export up to date. After the first full export only
+    items saved since the last sync are downloaded, and deletions are found
+    with an ID-only listing. Returns the number of items in the export and
+    whether anything changed.
+    """
+    output_file = library_file(data_path, library["name"])
+    if not state.get("last_sync") or not output_file.exists():
+        return save_items(fetch_library(session, library, page_size), output_file), True
+
+    current_ids = {item["Id"] for item in iter_pages(
+        session, library_params(library, Fields="", EnableUserData="false"), page_size
+    )}
+    items = read_items(output_file)
+    changed = {item["Id"]: item for item in fetch_library(
+        session, library, page_size, MinDateLastSaved=state["last_sync"]
+    )}
+    # IDs we have never seen but that were saved before the cutoff
+    missing = sorted(current_ids - items.keys() - changed.keys())
+    for start in range(0, len(missing), IDS_PER_REQUEST):
+        ids = ",".join(missing[start:start + IDS_PER_REQUEST])
+        for item in fetch_library(session, library, page_size, Ids=ids):
+            changed[item["Id"]] = item
+
+    removed = items.keys() - current_ids
+    changed = {item_id: item for item_id, item in changed.items()
+               if item_id in current_ids and item != items.get(item_id)}
+    print(f"{library['name']}: {len(changed)} new or modified, {len(removed)} removed since {state['last_sync']}")
+
+    if not changed and not removed:
+        return len(items), False
+    for item_id in removed:
+        del items[item_id]
+    items.update(changed)
+    # The listing confirmed what is left, so an emptied library replaces its export
+    return save_items(items.values(), output_file, allow_empty=True), True
+
+def sync_items(page_size: int = JELLYFIN_PAGE_SIZE, libraries: Optional[List[str]] = None) -> Tuple[int, bool]:
+    """
+    Sync every library, or only the named ones, concurrently over one
+    connection pool. Returns the number of items across all exported
+    libraries and whether anything changed.
+    """
+    data_path = validate_config()
+    state = load_sync_state()
+    known: Dict[str, dict] = state.get("libraries", {})
+    # Ask from slightly before this sync started so nothing saved while it runs is missed
+    started = (datetime.now(timezone.utc) - SYNC_OVERLAP).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=JELLYFIN_CONCURRENCY)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        found = get_libraries(session)
+        if not found:
+            raise RuntimeError("Could not find any movie or TV libraries!")
+        selected = found
+        if libraries:
+            wanted = {name.lower() for name in libraries}
+            selected = [library for library in found if library["name"].lower() in wanted]
+            if not selected:
+                raise RuntimeError(f"No library named {', '.join(libraries)}")
+        print(f"Syncing libraries: {', '.join(library['name'] for library in selected)}")
+
+        def sync_one(library):
+            previous = known.get(library["id"], {})
+            # A renamed library starts over in a new export file
+            if previous.get("name") != library["name"]:
+                previous = {}
+            return sync_library_items(session, library, previous, data_path, page_size)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(JELLYFIN_CONCURRENCY, len(selected)))) as pool:
+            # Each library runs in a copy of the caller's context, so output stays with whoever started the sync
+            futures = [pool.submit(contextvars.copy_context().run, sync_one, library) for library in selected]
+            results = [future.result() for future in futures]
+
+    changed = False
+    for library, (count, library_changed) in zip(selected, results):
+        known[library["id"]] = dict(library, count=count, last_sync=started)
+        changed = changed or library_changed
+
+    # Drop libraries that were removed or renamed on the server, along with their exports
+    if not libraries:
+        current = {library["id"] for library in found}
+        known = {library_id: library for library_id, library in known.items() if library_id in current}
+    # Exports in older formats are replaced by the snapshots too
+    keep = {library_file(data_path, library["name"]) for library in known.values()}
+    for path in (Path(data_path) / LIBRARIES_DIRNAME).iterdir():
+        if path.is_file() and path not in keep:
+            path.unlink()
+            changed = True
+
+    save_sync_state({"libraries": known})
+    return sum(library.get("count", 0) for library in known.values()), changed
+
+def save_items(items, output_file: Optional[Path] = None, allow_empty: bool = False) -> int:
+    """
+    Write items to a snapshot. The previous one is kept if nothing came back,
+    unless allow_empty says an empty result is real. Returns the number of items saved
+    """
+    output_file = Path(output_file or Path(validate_config()) / ITEMS_FILENAME)
+    count = write_snapshot(items, output_file, allow_empty)
+    if count or allow_empty:
+        print(f"Data saved to: {output_file}")
+    return count
+
+def synced_library_names() -> List[str]:
+    """Names of the libraries synced so far, none when Jellyfin is not configured"""
+    try:
+        return [library["name"] for library in load_sync_state().get("libraries", {}).values()]
+    except ValueError:
+        return []
+
+def find_library(name: str) -> Tuple[str, dict]:
+    """Synced library by name, with its ID"""
+    for library_id, library in load_sync_state().get("libraries", {}).items():
+        if library["name"].lower() == name.lower():
+            return library_id, library
+    raise ValueError(f"No synced library named {name}")
+
+def diff_library(name: str) -> Tuple[set, set, set]:
+    """Items added, removed and changed by the last sync of a library"""
+    _, library = find_library(name)
+    path = library_file(validate_config(), library["name"])
+    history = snapshot_history(path)
+    if not history:
+        raise ValueError(f"No earlier snapshot of {library['name']}")
+    return diff_snapshots(history[0], path)
+
+def rollback_library(name: str, steps: int = 1) -> Path:
+    """
+    Restore an earlier snapshot of a library. The sync state keeps its
+    last_sync, so the next sync stays incremental and only fetches items saved
+    since then instead of exporting over the restored file.
+    """
+    library_id, library = find_library(name)
+    path = library_file(validate_config(), library["name"])
+    restored = rollback_snapshot(path, steps)
+    with Snapshot(path) as snapshot:
+        count = len(snapshot)
+    state = load_sync_state()
+    state["libraries"][library_id]["count"] = count
+    save_sync_state(state)
+    return restored
 
 def main():
+    parser = argparse.ArgumentParser(description="Export Jellyfin libraries to local snapshots")
+    parser.add_argument("--diff", metavar="LIBRARY", help="Show what the last sync of a library changed")
+    parser.add_argument("--rollback", metavar="LIBRARY", help="Restore the previous snapshot of a library")
+    args = parser.parse_args()
+
+    try:
+        if args.diff:
+            added, removed, changed = diff_library(args.diff)
+            print(f"{len(added)} added, {len(removed)} removed, {len(changed)} changed")
+            return
+        if args.rollback:
+            _, library = find_library(args.rollback)
+            print(f"Restored {rollback_library(library['name']).name}, re-indexing {library['name']}...")
+            # Only the database is synced, an export would fetch over the restored snapshot
+            from jellyseek.rag.db_generator import update_database
+            update_database([library["name"]])
+            return
+    except ValueError as e:
+        print(e)
+        return
+
     print(f"Connecting to Jellyfin server at: {JELLYFIN_URL}")
     
-    items = fetch_items()
-    if items:
-        save_items(items)
-        print(f"Fetched and saved {len(items.get('Items', []))} movies")
+    try:
+        count, _ = sync_items()
+    except (ValueError, RuntimeError, requests.RequestException) as e:
+        print(e)
+        return
+    print(f"Fetched and saved {count} items")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,259 @@
+"""
+Versioned on-disk snapshots of exported library items.
+
+    header   "JSNP", format version (u16), reserved (u16)
+    blocks   compressed size (u32), record count (u32), zlib data
+             the data holds each record's length (u32), then the records
+             as compact JSON laid out as one array, "[" rec "," rec "]"
+    end      a block header of 0, 0
+    index    zlib JSON with each record's ID and CRC and each block's offset
+    trailer  index offset (u64), index size (u64), "JSNP"
+
+Blocks can be read front to back as a stream, or through the trailer and
+index with mmap. The index alone is enough to diff two snapshots.
+"""
+import json
+import mmap
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import struct
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+from jellyseek.jellyfin_export.config import JELLYFIN_SNAPSHOT_HISTORY
+
+MAGIC = b"JSNP"
+VERSION = 1
+SNAPSHOT_SUFFIX = ".jsnap"
+HISTORY_DIRNAME = "history"
+BLOCK_RECORDS = 512
+# Decompression speed barely depends on the level, writing is much faster at 1
+COMPRESSION_LEVEL = 1
+# Blocks decompressed ahead of the one being parsed when reading through mmap
+READ_AHEAD = 4
+
+HEADER = struct.Struct("<4sHH")
+BLOCK = struct.Struct("<II")
+RECORD = struct.Struct("<I")
+TRAILER = struct.Struct("<QQ4s")
+
+# The only item fields JellySeek reads, everything else Jellyfin sends is dropped
+SNAPSHOT_FIELDS = (
+    "Id", "Name", "Type", "PremiereDate", "RunTimeTicks", "Overview", "Genres", "Tags", "Actors",
+    "CriticRating", "OfficialRating", "LibraryId", "LibraryName",
+)
+
+def trim_item(item: dict) -> dict:
+    """Copy of the item with only the fields kept in snapshots"""
+    return {field: item[field] for field in SNAPSHOT_FIELDS if field in item}
+
+def encode_item(item: dict) -> bytes:
+    return json.dumps(trim_item(item), ensure_ascii=False, separators=(',', ':')).encode("utf-8")
+
+def _write_block(f, records: List[bytes]) -> int:
+    lengths = struct.pack(f"<{len(records)}I", *map(len, records))
+    data = zlib.compress(lengths + b"[" + b",".join(records) + b"]", COMPRESSION_LEVEL)
+    offset = f.tell()
+    f.write(BLOCK.pack(len(data), len(records)))
+    f.write(data)
+    return offset
+
+def _decode_block(data: bytes, count: int) -> List[dict]:
+    """Every record of a block, parsed in one pass over its JSON array"""
+    return json.loads(data[count * RECORD.size:])
+
+def _inflate(data: bytes, path: Path) -> bytes:
+    try:
+        return zlib.decompress(data)
+    except zlib.error:
+        raise ValueError(f"Truncated snapshot: {path}")
+
+def _check_header(header: bytes, path: Path):
+    if len(header) < HEADER.size:
+        raise ValueError(f"Truncated snapshot: {path}")
+    magic, version, _ = HEADER.unpack_from(header)
+    if magic != MAGIC:
+        raise ValueError(f"Not a library snapshot: {path}")
+    if version > VERSION:
+        raise ValueError(f"Snapshot format {version} is newer than supported ({VERSION}): {path}")
+
+def write_snapshot(items: Iterable[dict], path: Path, allow_empty: bool = False) -> int:
+    """
+    Write items to a temporary file and rename it over path once complete,
+    keeping the file it replaces in the history. Nothing is replaced when
+    there are no items, unless allow_empty is set. Returns the number of
+    items written.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+
+    ids, crcs, blocks = [], [], []
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0))
+            records = []
+            for item in items:
+                record = encode_item(item)
+                ids.append(str(item.get("Id", "")))
+                crcs.append(zlib.crc32(record))
+                records.append(record)
+                if len(records) == BLOCK_RECORDS:
+                    blocks.append(_write_block(f, records))
+                    records = []
+            if records:
+                blocks.append(_write_block(f, records))
+            f.write(BLOCK.pack(0, 0))
+
+            index = {"ids": ids, "crcs": crcs, "blocks": blocks, "block_records": BLOCK_RECORDS}
+            index = zlib.compress(json.dumps(index).encode("utf-8"))
+            index_offset = f.tell()
+            f.write(index)
+            f.write(TRAILER.pack(index_offset, len(index), MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    if not ids and not allow_empty:
+        tmp_path.unlink(missing_ok=True)
+        return 0
+    _install(tmp_path, path)
+    return len(ids)
+
+def _install(tmp_path: Path, path: Path):
+    """Archive the current snapshot, then atomically move the new one into place"""
+    if path.exists():
+        archived = history_dir(path) / f"{path.stem}.{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}{SNAPSHOT_SUFFIX}"
+        archived.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            # A hard link costs nothing and the old file stays in place until the rename
+            os.link(path, archived)
+        except OSError:
+            shutil.copy2(path, archived)
+    os.replace(tmp_path, path)
+    prune_history(path)
+
+def history_dir(path: Path) -> Path:
+    return Path(path).parent / HISTORY_DIRNAME
+
+def snapshot_history(path: Path) -> List[Path]:
+    """Earlier snapshots of path, newest first"""
+    path = Path(path)
+    return sorted(history_dir(path).glob(f"{path.stem}.*{SNAPSHOT_SUFFIX}"), reverse=True)
+
+def prune_history(path: Path, keep: int = JELLYFIN_SNAPSHOT_HISTORY):
+    for old in snapshot_history(path)[max(keep, 0):]:
+        old.unlink(missing_ok=True)
+
+def rollback_snapshot(path: Path, steps: int = 1) -> Path:
+    """
+    Put an earlier snapshot back in place, steps counting back from the
+    newest. The snapshot being replaced goes into the history as usual.
+    Returns the history file that was restored.
+    """
+    path = Path(path)
+    history = snapshot_history(path)
+    if len(history) < steps:
+        raise ValueError(f"No snapshot {steps} step(s) back for {path.name}")
+    restored = history[steps - 1]
+    tmp_path = path.with_suffix(".tmp")
+    shutil.copy2(restored, tmp_path)
+    _install(tmp_path, path)
+    return restored
+
+def iter_snapshot(path: Path) -> Iterator[dict]:
+    """Stream items from a snapshot front to back without reading the index"""
+    path = Path(path)
+    with open(path, "rb") as f:
+        _check_header(f.read(HEADER.size), path)
+        while True:
+            header = f.read(BLOCK.size)
+            if len(header) < BLOCK.size:
+                raise ValueError(f"Truncated snapshot: {path}")
+            size, count = BLOCK.unpack(header)
+            if not count:
+                return
+            data = f.read(size)
+            if len(data) != size:
+                raise ValueError(f"Truncated snapshot: {path}")
+            yield from _decode_block(_inflate(data, path), count)
+
+class Snapshot:
+    """
+    Memory-mapped snapshot. Opening it only reads the index, so IDs and
+    checksums are available without decompressing any items.
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            _check_header(self._map[:HEADER.size], self.path)
+            if len(self._map) < HEADER.size + TRAILER.size:
+                raise ValueError(f"Truncated snapshot: {self.path}")
+            index_offset, index_size, magic = TRAILER.unpack_from(self._map, len(self._map) - TRAILER.size)
+            if magic != MAGIC:
+                raise ValueError(f"Truncated snapshot: {self.path}")
+            index = json.loads(_inflate(self._map[index_offset:index_offset + index_size], self.path))
+        except BaseException:
+            self._map.close()
+            raise
+        self.ids: List[str] = index["ids"]
+        self.crcs: List[int] = index["crcs"]
+        self.blocks: List[int] = index["blocks"]
+        self.block_records: int = index.get("block_records", BLOCK_RECORDS)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+
+    def checksums(self) -> Dict[str, int]:
+        return dict(zip(self.ids, self.crcs))
+
+    def _block_data(self, number: int) -> Tuple[bytes, int]:
+        offset = self.blocks[number]
+        size, count = BLOCK.unpack_from(self._map, offset)
+        start = offset + BLOCK.size
+        return _inflate(self._map[start:start + size], self.path), count
+
+    def block(self, number: int) -> List[dict]:
+        """Items of one block, decompressed straight from the mapping"""
+        return _decode_block(*self._block_data(number))
+
+    def __iter__(self) -> Iterator[dict]:
+        workers = min(READ_AHEAD, (os.cpu_count() or 1) - 1)
+        if workers < 1 or len(self.blocks) < 2:
+            for number in range(len(self.blocks)):
+                yield from self.block(number)
+            return
+        # zlib releases the GIL, so later blocks inflate on other cores while this one is parsed
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for number in range(len(self.blocks)):
+                pending.append(pool.submit(self._block_data, number))
+                if len(pending) > READ_AHEAD:
+                    yield from _decode_block(*pending.popleft().result())
+            while pending:
+                yield from _decode_block(*pending.popleft().result())
+
+def diff_snapshots(old_path: Path, new_path: Path) -> Tuple[Set[str], Set[str], Set[str]]:
+    """IDs added, removed and changed between two snapshots, compared by index only"""
+    with Snapshot(old_path) as old, Snapshot(new_path) as new:
+        before, after = old.checksums(), new.checksums()
+    added = after.keys() - before.keys()
+    removed = before.keys() - after.keys()
+    changed = {item_id for item_id in after.keys() & before.keys() if after[item_id] != before[item_id]}
+    return set(added), set(removed), changed
@@ -0,0 +1,132 @@
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+from jellyseek.rag.config import (
+    CHROMADB_PATH,
+    METADATA_FILTERS,
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_THRESHOLD
+)
+
+LIBRARY_VERSION_FILE = "library_version"
+
+def library_version() -> str:
+    """Stamp that changes whenever the indexed library changes"""
+    try:
+        with open(os.path.join(CHROMADB_PATH, LIBRARY_VERSION_FILE), "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+def bump_library_version():
+    """Record that the library changed, invalidating cached answers in every process"""
+    os.makedirs(CHROMADB_PATH, exist_ok=True)
+    path = os.path.join(CHROMADB_PATH, LIBRARY_VERSION_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(f"{path}.tmp", path)
+
+@dataclass
+class CachedAnswer:
+    embedding: List[float]
+    norm: float
+    filters: str
+    version: str
+    created: float
+    answer: str
+
+class AnswerCache:
+    """
+    Reuses answers for questions whose embedding is within a cosine-similarity
+    threshold of an earlier one. Entries are tied to the library version and to
+    the metadata filters of the question, so "80s horror" never answers
+    "90s horror", and are bounded by count (LRU) and age.
+    """
+    def __init__(self, embed: Callable[[str], List[float]], max_entries: int,
+                 max_age: float, threshold: float):
+        self.embed = embed
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.threshold = threshold
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _filters_key(question: str) -> str:
+        if not METADATA_FILTERS:
+            return ""
+        from jellyseek.rag.filters import extract_filters
+        return json.dumps(extract_filters(question), sort_keys=True)
+
+    def lookup(self, question: str) -> Optional[str]:
+        """Return a stored answer for a similar enough question, if any"""
+        if not self._entries:
+            return None
+        embedding = self.embed(question)
+        norm = math.sqrt(sum(x * x for x in embedding)) or 1.0
+        filters = self._filters_key(question)
+        version = library_version()
+        now = time.time()
+
+        with self._lock:
+            best_key, best_score = None, self.threshold
+            for key, entry in list(self._entries.items()):
+                if entry.version != version or now - entry.created > self.max_age:
+                    del self._entries[key]
+                    continue
+                if entry.filters != filters:
+                    continue
+                score = sum(a * b for a, b in zip(embedding, entry.embedding)) / (norm * entry.norm)
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key].answer
+
+    def store(self, question: str, answer: str):
+        embedding = self.embed(question)
+        entry = CachedAnswer(
+            embedding=embedding,
+            norm=math.sqrt(sum(x * x for x in embedding)) or 1.0,
+            filters=self._filters_key(question),
+            version=library_version(),
+            created=time.time(),
+            answer=answer
+        )
+        key = " ".join(question.lower().split())
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_answer_cache: Optional[AnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Shared answer cache, None when ANSWER_CACHE_SIZE is 0"""
+    global _answer_cache
+    if ANSWER_CACHE_SIZE <= 0:
+        return None
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            from jellyseek.rag.database import get_embedding_function
+            _answer_cache = AnswerCache(
+                embed=lambda question: get_embedding_function()([question])[0],
+                max_entries=ANSWER_CACHE_SIZE,
+                max_age=ANSWER_CACHE_TTL,
+                threshold=ANSWER_CACHE_THRESHOLD
+            )
+        return _answer_cache
@@ -0,0 +1,102 @@
+import contextlib
+import json
+import statistics
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional, TextIO
+from jellyseek.rag.config import BATCH_WORKERS
+from jellyseek.rag.database import initialize_database
+from jellyseek.rag.pipeline import answer_query
+
+def read_questions(source: TextIO) -> Iterator[dict]:
+    """
+    Yield {"id", "question"} records from JSONL. Each line is either a JSON
+    string or an object with a "question" field and an optional "id".
+    """
+    for line_number, line in enumerate(source, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"Skipping line {line_number}: invalid JSON ({e})", file=sys.stderr)
+            continue
+        if isinstance(record, str):
+            record = {"question": record}
+        if not isinstance(record, dict) or not record.get("question"):
+            print(f"Skipping line {line_number}: no question found", file=sys.stderr)
+            continue
+        record.setdefault("id", line_number)
+        yield record
+
+def run_one(collection, record: dict) -> dict:
+    """Answer one question, turning failures into an error field"""
+    start = time.perf_counter()
+    result = {"id": record["id"], "question": record["question"]}
+    try:
+        answer = answer_query(collection, record["question"])
+        result.update(
+            answer=answer.text,
+            search_query=answer.retrieval.search_query,
+            retrieved_ids=answer.retrieval.ids,
+            timings=answer.timings
+        )
+    except Exception as e:
+        result.update(answer=None, error=str(e), timings={})
+    result["timings"]["total"] = time.perf_counter() - start
+    return result
+
+def print_summary(results_timings, elapsed: float, errors: int):
+    count = len(results_timings)
+    print(f"\nAnswered {count - errors}/{count} questions in {elapsed:.1f}s "
+          f"({count / elapsed if elapsed else 0:.2f} questions/s)", file=sys.stderr)
+    stages = sorted({stage for timings in results_timings for stage in timings})
+    for stage in stages:
+        values = [timings[stage] for timings in results_timings if stage in timings]
+        print(f"  {stage:<10} mean {statistics.mean(values):.3f}s  "
+              f"median {statistics.median(values):.3f}s  max {max(values):.3f}s", file=sys.stderr)
+
+def run_batch(input_path: str = "-", output_path: str = "-", workers: Optional[int] = None):
+    """
+    Answer every question in input_path with a pool of workers sharing one
+    collection and LLM client, writing one JSON result per line in input order.
+    """
+    workers = workers or BATCH_WORKERS
+    all_timings = []
+    errors = 0
+    # Results go to the real stdout, progress messages to stderr so stdout stays valid JSONL
+    stdout = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        _, _, _, collection = initialize_database()
+        if collection.count() == 0:
+            print("The database is empty, run jellyseek and /update first.")
+            return
+
+        with contextlib.ExitStack() as files:
+            source = sys.stdin if input_path == "-" else files.enter_context(open(input_path, "r", encoding="utf-8"))
+            sink = stdout if output_path == "-" else files.enter_context(open(output_path, "w", encoding="utf-8"))
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                questions = read_questions(source)
+
+                def write(result):
+                    nonlocal errors
+                    sink.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    sink.flush()
+                    all_timings.append(result["timings"])
+                    errors += "error" in result
+
+                # Keep a bounded number of questions in flight so huge inputs stream
+                for record in questions:
+                    pending.append(pool.submit(run_one, collection, record))
+                    if len(pending) >= workers * 2:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+
+            print_summary(all_timings, time.perf_counter() - start, errors)
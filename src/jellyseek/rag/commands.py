@@ -1,7 +1,5 @@
 from dataclasses import dataclass
 from typing import Dict, Callable, Any, Optional
-from jellyseek.jellyfin_export.main import fetch_items, save_items
-from jellyseek.rag.db_generator import generate_database
 
 @dataclass
 class Command:
@@ -9,20 +7,27 @@ class Command:
     name: str
     handler: Callable[..., Any]
     description: str
+    needs_database: bool = True
 
 class CommandHandler:
     def __init__(self):
         self.commands: Dict[str, Command] = {}
 
-    def register(self, name: str, handler: Callable[..., Any], description: str):
+    def register(self, name: str, handler: Callable[..., Any], description: str, needs_database: bool = True):
         """Register a new command"""
-        self.commands[name] = Command(name, handler, description)
+        self.commands[name] = Command(name, handler, description, needs_database)
+
+    def needs_database(self, command: str) -> bool:
+        """Whether the command has to wait for the database to open"""
+        cmd = self.commands.get(command.split(maxsplit=1)[0])
+        return cmd is not None and cmd.needs_database
 
     def handle(self, command: str, **kwargs) -> Optional[bool]:
         """Handle a command. Returns True if handled, False if not"""
-        cmd = self.commands.get(command)
+        name, _, args = command.partition(" ")
+        cmd = self.commands.get(name)
         if cmd:
-            return cmd.handler(**kwargs)
+            return cmd.handler(args=args.strip(), **kwargs)
         return None
 
     def get_help(self) -> str:
@@ -36,28 +41,59 @@ def cmd_quit(**kwargs) -> bool:
     """Quit the application"""
     return True
 
-def cmd_update(collection, embedding, collection_name, chroma_client, **kwargs) -> bool:
-    """Update the movie database"""
-    print("\nChecking for updates...")
-    
-    # Fetch new items from Jellyfin
-    new_items = fetch_items()
-    if not new_items or not isinstance(new_items, dict) or 'Items' not in new_items:
-        print("Failed to fetch valid items from Jellyfin")
-        return False
-        
-    if not new_items['Items']:
-        print("No movies found in Jellyfin")
+def cmd_update(sync=None, full: bool = False, args: str = "", **kwargs) -> bool:
+    """
+    Update the movie database, in the background when a sync worker is given.
+    Comma-separated library names after the command refresh only those.
+    """
+    libraries = [name.strip() for name in args.split(",") if name.strip()] or None
+    if sync is None:
+        from jellyseek.rag.sync import sync_library
+
+        print("\nChecking for updates...")
+        try:
+            return sync_library(full, libraries)
+        except Exception as e:
+            print(f"Error creating database: {str(e)}")
+            return False
+
+    if not sync.start(full, libraries):
+        print(f"\n{sync.describe()}")
         return False
+    print("\nSyncing library in the background, you can keep asking questions.")
+    return False
+
+def cmd_rebuild(sync=None, **kwargs) -> bool:
+    """Rebuild the whole database next to the current one and swap it in"""
+    kwargs.pop("args", None)
+    return cmd_update(sync=sync, full=True, **kwargs)
 
-    try:
-        save_items(new_items)
-        print("Saved new items, regenerating database...")
-        generate_database(force_update=True)
-        return True
-    except Exception as e:
-        print(f"Error creating database: {str(e)}")
+def cmd_status(sync=None, **kwargs) -> bool:
+    """Show the state of the library sync"""
+    if sync is None:
+        print("\nBackground sync is not available here.")
+    else:
+        print(f"\n{sync.describe()}")
+    return False
+
+def cmd_new(conversation=None, **kwargs) -> bool:
+    """Forget the current conversation so the next question starts fresh"""
+    if conversation is not None:
+        conversation.reset()
+    print("\nStarted a new conversation.")
+    return False
+
+def cmd_stats(**kwargs) -> bool:
+    """Show per-stage latency percentiles"""
+    from jellyseek.rag.config import TRACING_ENABLED
+    from jellyseek.rag.tracing import format_stats
+
+    if not TRACING_ENABLED:
+        print("\nTracing is disabled. Set TRACING_ENABLED=true to record stage timings.")
         return False
+    print("\nLatency by stage (recent queries):")
+    print(format_stats())
+    return False
 
 def cmd_help(handler: CommandHandler, **kwargs) -> bool:
     """Show help text"""
@@ -70,8 +106,12 @@ def create_command_handler() -> CommandHandler:
     handler = CommandHandler()
     
     # Register commands
-    handler.register("/quit", cmd_quit, "Exit the application")
-    handler.register("/update", cmd_update, "Check for new movies and update the database")
-    handler.register("/help", lambda **kwargs: cmd_help(handler, **kwargs), "Show this help message")
+    handler.register("/quit", cmd_quit, "Exit the application", needs_database=False)
+    handler.register("/update", cmd_update, "Check for new movies and update the database in the background, optionally only the named libraries", needs_database=False)
+    handler.register("/rebuild", cmd_rebuild, "Rebuild the database in the background and swap it in when done", needs_database=False)
+    handler.register("/status", cmd_status, "Show library sync progress", needs_database=False)
+    handler.register("/new", cmd_new, "Start a new conversation, follow-ups no longer refer to earlier answers", needs_database=False)
+    handler.register("/stats", cmd_stats, "Show latency percentiles for each pipeline stage", needs_database=False)
+    handler.register("/help", lambda **kwargs: cmd_help(handler, **kwargs), "Show this help message", needs_database=False)
     
     return handler
\ No newline at end of file
@@ -16,6 +16,77 @@ OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "bge-large")
 GENERATION_MODEL = os.getenv("GENERATION_MODEL", "gemma3:27b-it-qat")
 
+# How long Ollama keeps the generation model loaded between requests ("30m", "-1" for forever)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+if OLLAMA_KEEP_ALIVE.lstrip("-").isdigit():
+    OLLAMA_KEEP_ALIVE = int(OLLAMA_KEEP_ALIVE)
+
+# Query rewrite before embedding: "llm" (rewrite with REWRITE_MODEL), "heuristic"
+# (skip the rewrite for short keyword-style queries) or "off" (embed the raw question)
+QUERY_REWRITE_MODE = os.getenv("QUERY_REWRITE_MODE", "llm").lower()
+REWRITE_MODEL = os.getenv("REWRITE_MODEL", GENERATION_MODEL)
+REWRITE_HEURISTIC_MAX_WORDS = int(os.getenv("REWRITE_HEURISTIC_MAX_WORDS", "4"))
+REWRITE_CACHE_SIZE = int(os.getenv("REWRITE_CACHE_SIZE", "256"))
+
+# Fuse BM25 keyword hits with vector search results
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+
+# Turn constraints like "90s horror under 2 hours" into metadata filters
+METADATA_FILTERS = os.getenv("METADATA_FILTERS", "true").lower() in ("1", "true", "yes")
+
+# Context assembly: candidates retrieved before reranking, the prompt budget for
+# movie documents (in tokens) and the similarity above which two movies are duplicates
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "30"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+# Semantic answer cache: entries kept (0 disables it), max age in seconds and the
+# cosine similarity above which a previous answer is reused
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "128"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+# "More like this": neighbours precomputed per movie, and whether the list is
+# explained by the generation model instead of printed as is
+SIMILAR_TOP_K = int(os.getenv("SIMILAR_TOP_K", "10"))
+SIMILAR_EXPLAIN = os.getenv("SIMILAR_EXPLAIN", "false").lower() in ("1", "true", "yes")
+
+# Chat follow-ups continue from the token state Ollama returned for the previous
+# answer, a conversation starts over once it holds this many tokens (0 = every
+# question starts a new one). Keep it below the model's context window.
+CONVERSATION_MAX_TOKENS = int(os.getenv("CONVERSATION_MAX_TOKENS", "4096"))
+
+# Per-stage latency tracing (shown by /stats and served at /metrics) and the
+# number of recent samples per stage used for percentiles
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes")
+TRACE_WINDOW = int(os.getenv("TRACE_WINDOW", "1000"))
+# Write a cProfile dump for every query into this directory when set
+PROFILE_DIR = os.path.expanduser(os.getenv("PROFILE_DIR", ""))
+
+# Parallel workers for `jellyseek batch`
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+
+# Minutes between automatic background library syncs in chat, 0 turns them off
+AUTO_SYNC_INTERVAL = float(os.getenv("AUTO_SYNC_INTERVAL", "0"))
+
+# HTTP query service for `jellyseek serve`
+SERVE_HOST = os.getenv("SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.getenv("SERVE_PORT", "8765"))
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", "8"))
+# Requests in flight before new ones are rejected with 503
+SERVE_MAX_PENDING = int(os.getenv("SERVE_MAX_PENDING", "32"))
+
+# Print answers token by token as they are generated
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() in ("1", "true", "yes")
+
+# Embedding pipeline: documents per Ollama request, parallel requests and retries per batch
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+
+# Maximum number of vectors kept in the on-disk embedding cache (0 disables it)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "200000"))
+
 # Prompt file paths - resolve relative to project root
 EMBEDDING_PROMPT = os.path.join(PROJECT_ROOT, os.getenv("embeddings_prompt", "prompts/embeddings_prompt.txt"))
 GENERATION_PROMPT = os.path.join(PROJECT_ROOT, os.getenv("generation_prompt", "prompts/generation_prompt.txt"))
@@ -30,19 +101,13 @@ JELLYFIN_DATA_PATH = os.path.expanduser(os.getenv("JELLYFIN_DATA_PATH", DEFAULT_
 
 MOVIES_COLLECTION_NAME = os.getenv("MOVIES_COLLECTION_NAME", "movies_rag")
 
-# Create directories if they don't exist
-os.makedirs(CHROMADB_PATH, exist_ok=True)
-os.makedirs(JELLYFIN_DATA_PATH, exist_ok=True)
-
-# Validate required environment variables
-if not OLLAMA_BASE_URL:
-    raise ValueError("OLLAMA_BASE_URL must be set in the environment variables")
-
-# Validate prompt files exist
-if not os.path.exists(EMBEDDING_PROMPT):
-    raise FileNotFoundError(f"Embedding prompt file not found at: {EMBEDDING_PROMPT}")
-if not os.path.exists(GENERATION_PROMPT):
-    raise FileNotFoundError(f"Generation prompt file not found at: {GENERATION_PROMPT}")
+# Vector store: chroma, or numpy for memory-mapped matrices stored next to the Chroma data
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+# numpy backend: float16 or int8 vectors, library size from which an IVF index
+# is built (0 never builds one) and IVF lists scanned per query
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float16").lower()
+VECTOR_ANN_THRESHOLD = int(os.getenv("VECTOR_ANN_THRESHOLD", "50000"))
+VECTOR_ANN_PROBES = int(os.getenv("VECTOR_ANN_PROBES", "8"))
 
 # Optional: Set default models if not specified
 if not EMBEDDING_MODEL:
@@ -52,3 +117,37 @@ if not EMBEDDING_MODEL:
 if not GENERATION_MODEL:
     GENERATION_MODEL = "gemma3:27b-it-qat"
     print(f"Warning: Using default generation model: {GENERATION_MODEL}")
+
+_validated = False
+
+def validate_config():
+    """
+    Check required settings and create the data directories. Called on first
+    use rather than at import so the CLI starts without touching the disk.
+    """
+    global _validated
+    if _validated:
+        return
+
+    # Validate required environment variables
+    if not OLLAMA_BASE_URL:
+        raise ValueError("OLLAMA_BASE_URL must be set in the environment variables")
+
+    if QUERY_REWRITE_MODE not in ("llm", "heuristic", "off"):
+        raise ValueError(f"QUERY_REWRITE_MODE must be one of llm, heuristic or off, got: {QUERY_REWRITE_MODE}")
+
+    if VECTOR_BACKEND not in ("chroma", "numpy"):
+        raise ValueError(f"VECTOR_BACKEND must be chroma or numpy, got: {VECTOR_BACKEND}")
+    if VECTOR_DTYPE not in ("float16", "int8"):
+        raise ValueError(f"VECTOR_DTYPE must be float16 or int8, got: {VECTOR_DTYPE}")
+
+    # Validate prompt files exist
+    if not os.path.exists(EMBEDDING_PROMPT):
+        raise FileNotFoundError(f"Embedding prompt file not found at: {EMBEDDING_PROMPT}")
+    if not os.path.exists(GENERATION_PROMPT):
+        raise FileNotFoundError(f"Generation prompt file not found at: {GENERATION_PROMPT}")
+
+    # Create directories if they don't exist
+    os.makedirs(CHROMADB_PATH, exist_ok=True)
+    os.makedirs(JELLYFIN_DATA_PATH, exist_ok=True)
+    _validated = True
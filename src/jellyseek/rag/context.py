@@ -0,0 +1,134 @@
+import re
+from typing import Dict, List, Set, Tuple
+from jellyseek.rag.config import CONTEXT_TOKEN_BUDGET, CONTEXT_DEDUP_THRESHOLD
+from jellyseek.rag.filters import genre_hints
+from jellyseek.rag.keyword_index import tokenize
+
+# Rough tokens-per-character ratio for English text, good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+# How much a question term matching each field counts when reranking
+FIELD_WEIGHTS = {"Title": 3.0, "Genres": 2.0, "Tags": 2.0, "Actors": 2.0, "Plot": 1.0}
+
+# Added for every genre the question only hints at ("heist", "kids") that a movie has
+GENRE_HINT_BOOST = 0.5
+
+# Field values that carry no information for the generation model
+EMPTY_VALUES = {"", "unknown", "none", "not rated", "no plot available"}
+
+STOPWORDS = {
+    "a", "about", "an", "and", "any", "are", "as", "at", "be", "best", "by", "can", "film", "films",
+    "for", "from", "give", "good", "have", "i", "in", "is", "it", "like", "me", "movie", "movies",
+    "of", "on", "or", "recommend", "show", "some", "something", "that", "the", "to", "want",
+    "watch", "what", "which", "with", "you",
+}
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def parse_document(document: str) -> Dict[str, str]:
+    """Split a document built by load_movie_json into its "Field: value" lines"""
+    fields = {}
+    for line in document.split("\n"):
+        name, sep, value = line.partition(": ")
+        if sep:
+            fields[name] = value
+        elif fields:
+            # Plots can span several lines
+            last = next(reversed(fields))
+            fields[last] += "\n" + line
+    return fields
+
+def compact_document(fields: Dict[str, str]) -> str:
+    """Drop fields without information, keeping the document layout"""
+    return "\n".join(
+        f"{name}: {value}" for name, value in fields.items()
+        if value.strip().lower() not in EMPTY_VALUES and value.strip() != "0"
+    )
+
+def rerank(question: str, ids: List[str], documents: List[str]) -> List[int]:
+    """
+    Cheap local reranker: the retrieval rank plus weighted overlap between
+    question terms and the title, genres, tags, actors and plot, and a boost
+    for genres the question hints at. Returns candidate positions, best first.
+    """
+    terms = {t for t in tokenize(question) if t not in STOPWORDS}
+    hints = {genre.lower() for genre in genre_hints(question)}
+    scores = []
+    for rank, document in enumerate(documents):
+        fields = parse_document(document)
+        overlap = sum(
+            weight * len(terms & set(tokenize(fields.get(name, ""))))
+            for name, weight in FIELD_WEIGHTS.items()
+        )
+        genres = {genre.strip().lower() for genre in fields.get("Genres", "").split(",")}
+        boost = GENRE_HINT_BOOST * len(hints & genres)
+        scores.append((overlap / (len(terms) or 1) + 10.0 / (10 + rank) + boost, -rank))
+    return sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+
+def shingles(fields: Dict[str, str]) -> Set[str]:
+    words = tokenize(f"{fields.get('Title', '')} {fields.get('Plot', '')}")
+    return {" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+def is_near_duplicate(candidate: Set[str], selected: List[Set[str]], threshold: float) -> bool:
+    """Jaccard similarity of word 3-grams against the documents already chosen"""
+    for other in selected:
+        union = len(candidate | other)
+        if union and len(candidate & other) / union >= threshold:
+            return True
+    return False
+
+def trim_plot(fields: Dict[str, str], token_budget: int) -> Dict[str, str]:
+    """Shorten the plot to whole sentences so the document fits the budget"""
+    plot = fields.get("Plot", "")
+    without_plot = estimate_tokens(compact_document({**fields, "Plot": ""}))
+    allowed_chars = (token_budget - without_plot) * CHARS_PER_TOKEN
+    if allowed_chars <= 0:
+        return {**fields, "Plot": ""}
+    sentences = SENTENCE_END_RE.split(plot)
+    kept = ""
+    for sentence in sentences:
+        if len(kept) + len(sentence) + 1 > allowed_chars:
+            break
+        kept = f"{kept} {sentence}".strip()
+    return {**fields, "Plot": kept or plot[:allowed_chars].rsplit(" ", 1)[0] + "..."}
+
+def build_context(question: str, ids: List[str], documents: List[str], metadatas: List[dict],
+                  token_budget: int = CONTEXT_TOKEN_BUDGET,
+                  dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD) -> Tuple[List[str], List[str], List[dict]]:
+    """
+    Rerank over-retrieved candidates, drop near-duplicates and fill the
+    token budget with compacted documents, trimming plots when needed.
+    Returns the selected (ids, documents, metadatas) in prompt order.
+    """
+    selected_ids, selected_docs, selected_meta = [], [], []
+    selected_shingles: List[Set[str]] = []
+    remaining = token_budget
+
+    for i in rerank(question, ids, documents):
+        fields = parse_document(documents[i])
+        doc_shingles = shingles(fields)
+        if is_near_duplicate(doc_shingles, selected_shingles, dedup_threshold):
+            continue
+
+        document = compact_document(fields)
+        # Two newlines separate documents in the prompt
+        cost = estimate_tokens(document) + 1
+        if cost > remaining:
+            # Give a partially fitting document a shortened plot rather than dropping it
+            if remaining < token_budget // 10:
+                break
+            document = compact_document(trim_plot(fields, remaining - 1))
+            cost = estimate_tokens(document) + 1
+            if cost > remaining:
+                continue
+
+        selected_ids.append(ids[i])
+        selected_docs.append(document)
+        selected_meta.append(metadatas[i])
+        selected_shingles.append(doc_shingles)
+        remaining -= cost
+
+    return selected_ids, selected_docs, selected_meta
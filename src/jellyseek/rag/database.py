@@ -1,52 +1,202 @@
-import chromadb
 import os
-from langchain_ollama import OllamaEmbeddings
-from jellyseek.rag.config import MOVIES_COLLECTION_NAME, CHROMADB_PATH, EMBEDDING_MODEL, OLLAMA_BASE_URL
+import threading
+from functools import lru_cache
+from jellyseek.rag.config import MOVIES_COLLECTION_NAME, CHROMADB_PATH, EMBEDDING_MODEL, OLLAMA_BASE_URL, HYBRID_SEARCH, VECTOR_BACKEND, validate_config
+from jellyseek.rag.embedding_cache import with_embedding_cache
+from jellyseek.rag.keyword_index import get_keyword_index, reciprocal_rank_fusion
+from jellyseek.rag.tracing import span
 
 class ChromaDBEmbeddingFunction:
     def __init__(self, langchain_embeddings):
-        self.langchain_embeddings = langchain_embeddings
+        self.langchain_embeddings = with_embedding_cache(langchain_embeddings)
 
     def __call__(self, input):
         if isinstance(input, str):
             input = [input]
-        return self.langchain_embeddings.embed_documents(input)
+        with span("embed"):
+            return self.langchain_embeddings.embed_documents(input)
 
-def initialize_database():
-    """Initialize ChromaDB client and collection"""
-    # Ensure the database directory exists
-    os.makedirs(CHROMADB_PATH, exist_ok=True)
-    
-    chroma_client = chromadb.PersistentClient(path=CHROMADB_PATH)
-    collection_name = MOVIES_COLLECTION_NAME
-    
-    embedding = ChromaDBEmbeddingFunction(
+@lru_cache(maxsize=None)
+def get_embedding_function() -> ChromaDBEmbeddingFunction:
+    """Shared embedding function for the configured Ollama embedding model"""
+    from langchain_ollama import OllamaEmbeddings
+    return ChromaDBEmbeddingFunction(
         OllamaEmbeddings(
             model=EMBEDDING_MODEL,
             base_url=OLLAMA_BASE_URL
         )
     )
 
-    # Get or create collection by name
-    collection = chroma_client.get_or_create_collection(
-        name=collection_name,
-        embedding_function=embedding,
-        metadata={"description": "Movies RAG collection"}
-    )
+ACTIVE_COLLECTION_FILE = "active_collection"
+
+def active_collection_name() -> str:
+    """Name of the collection queries should use, switched by full rebuilds"""
+    try:
+        with open(os.path.join(CHROMADB_PATH, ACTIVE_COLLECTION_FILE), "r") as f:
+            return f.read().strip() or MOVIES_COLLECTION_NAME
+    except FileNotFoundError:
+        return MOVIES_COLLECTION_NAME
+
+def set_active_collection_name(name: str):
+    """Atomically point every reader at another collection"""
+    path = os.path.join(CHROMADB_PATH, ACTIVE_COLLECTION_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        f.write(name)
+    os.replace(f"{path}.tmp", path)
+
+def shadow_collection_name(live_name: str) -> str:
+    """The collection a full rebuild writes into while live_name keeps serving"""
+    shadow = f"{MOVIES_COLLECTION_NAME}_shadow"
+    return MOVIES_COLLECTION_NAME if live_name == shadow else shadow
+
+def open_client():
+    """
+    Client for the configured vector store. Both backends answer the same
+    collection calls, numpy keeps memory-mapped matrices in CHROMADB_PATH/numpy.
+    """
+    if VECTOR_BACKEND == "numpy":
+        from jellyseek.rag.vector_store import NumpyClient
+        return NumpyClient(path=os.path.join(CHROMADB_PATH, "numpy"))
 
-    if collection.count() > 0:
-        print(f"\nFound existing database with {collection.count()} movies.")
-    else:
-        print("\nCreated new empty database.")
+    # chromadb takes seconds to import, load it on first use
+    import chromadb
+    return chromadb.PersistentClient(path=CHROMADB_PATH)
+
+def collection_count() -> int:
+    """Number of documents in the active collection, 0 if it doesn't exist"""
+    chroma_client = open_client()
+    try:
+        return chroma_client.get_collection(name=active_collection_name()).count()
+    except ValueError:
+        return 0
+
+class LiveCollection:
+    """
+    Proxy for the active collection. It follows the active-collection pointer,
+    so when a rebuild swaps in a new collection every reader, in this process
+    or another one, moves over on its next call without reopening anything.
+    """
+    def __init__(self, chroma_client, embedding):
+        self._client = chroma_client
+        self._embedding = embedding
+        self._lock = threading.Lock()
+        self._pointer = os.path.join(CHROMADB_PATH, ACTIVE_COLLECTION_FILE)
+        self._version = None
+        self._collection = None
+
+    def _pointer_version(self):
+        try:
+            stat = os.stat(self._pointer)
+            return stat.st_ino, stat.st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @property
+    def current(self):
+        version = self._pointer_version()
+        if self._collection is None or version != self._version:
+            with self._lock:
+                if self._collection is None or version != self._version:
+                    self._collection = self._client.get_or_create_collection(
+                        name=active_collection_name(),
+                        embedding_function=self._embedding,
+                        metadata={"description": "Movies RAG collection"}
+                    )
+                    self._version = version
+        return self._collection
+
+    def __getattr__(self, attr):
+        return getattr(self.current, attr)
+
+def initialize_database(verbose: bool = True):
+    """Initialize the vector store client and collection"""
+    # Ensure the database directory exists
+    validate_config()
+    
+    chroma_client = open_client()
+    
+    embedding = get_embedding_function()
+
+    # Get or create the active collection, following later swaps
+    collection = LiveCollection(chroma_client, embedding)
+    collection_name = collection.name
+
+    if verbose:
+        if collection.count() > 0:
+            print(f"\nFound existing database with {collection.count()} movies.")
+        else:
+            print("\nCreated new empty database.")
     
     return chroma_client, collection_name, embedding, collection
 
-def query_database(collection, query_text: str, n_results: int = 10):
-    """Query the ChromaDB collection"""
-    results = collection.query(
-        query_texts=[query_text],
-        n_results=n_results
-    )
+class LazyDatabase:
+    """
+    Opens the ChromaDB client and collection on a background thread so the
+    chat prompt appears immediately. get() blocks until it is ready.
+    """
+    def __init__(self):
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(target=self._load, name="jellyseek-db", daemon=True)
+
+    def start(self) -> "LazyDatabase":
+        self._thread.start()
+        return self
+
+    def _load(self):
+        try:
+            self._result = initialize_database(verbose=False)
+        except Exception as e:
+            self._error = e
+
+    def get(self):
+        """Return (chroma_client, collection_name, embedding, collection)"""
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+def query_database(collection, query_text: str, n_results: int = 10, where: dict = None):
+    """Query the movie collection"""
+    _, documents, metadatas = search_movies(collection, query_text, n_results, where)
+    return documents, metadatas
+
+def search_movies(collection, query_text: str, n_results: int = 10, where: dict = None):
+    """
+    Return (ids, documents, metadatas) for the best matches, fusing vector
+    hits with BM25 keyword hits. An optional where clause restricts both
+    to matching metadata.
+    """
+    with span("vector_search"):
+        results = collection.query(
+            query_texts=[query_text],
+            n_results=n_results,
+            where=where
+        )
+    ids = [doc_id for sublist in results["ids"] for doc_id in sublist]
     documents = [doc for sublist in results["documents"] for doc in sublist]
     metadatas = [meta for sublist in results["metadatas"] for meta in sublist]
-    return documents, metadatas
\ No newline at end of file
+    if not HYBRID_SEARCH:
+        return ids, documents, metadatas
+
+    # Over-fetch keyword hits when filtering, some will not match the where clause
+    with span("keyword_search"):
+        keyword_hits = get_keyword_index(collection.name).search(query_text, n_results * 4 if where else n_results)
+    if not keyword_hits:
+        return ids, documents, metadatas
+
+    found = dict(zip(ids, zip(documents, metadatas)))
+    missing = [doc_id for doc_id, _ in keyword_hits if doc_id not in found]
+    if missing:
+        with span("keyword_fetch"):
+            extra = collection.get(ids=missing, where=where, include=["documents", "metadatas"])
+        found.update(zip(extra["ids"], zip(extra["documents"], extra["metadatas"])))
+
+    # Keyword hits can point at ids that were filtered out or are no longer in the collection
+    keyword_ids = [doc_id for doc_id, _ in keyword_hits if doc_id in found]
+    fused_ids = reciprocal_rank_fusion([ids, keyword_ids])[:n_results]
+    return (
+        fused_ids,
+        [found[doc_id][0] for doc_id in fused_ids],
+        [found[doc_id][1] for doc_id in fused_ids]
+    )
\ No newline at end of file
@@ -1,20 +1,35 @@
-from langchain_ollama import OllamaEmbeddings
-import chromadb
+import contextvars
+import gc
 import os
 import json
+import time
 from pathlib import Path
-from datetime import datetime
-from typing import Dict
-from collections import OrderedDict
-import re, unicodedata, uuid
+from typing import Dict, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
 from jellyseek.rag.config import (
     OLLAMA_BASE_URL, 
     EMBEDDING_MODEL, 
     GENERATION_MODEL, 
-    CHROMADB_PATH,
     JELLYFIN_DATA_PATH,
-    MOVIES_COLLECTION_NAME
+    validate_config,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_CONCURRENCY,
+    EMBEDDING_MAX_RETRIES
 )
+from jellyseek.rag.answer_cache import bump_library_version
+from jellyseek.rag.database import active_collection_name, open_client, set_active_collection_name, shadow_collection_name
+from jellyseek.rag.embedding_cache import with_embedding_cache
+from jellyseek.rag.filters import genre_field, slug
+from jellyseek.rag.keyword_index import BM25Index, get_keyword_index, save_keyword_index
+from jellyseek.rag.similar import get_similarity_graph, refresh_similarity_graph
+
+# Jellyfin runtimes are in 100ns ticks
+TICKS_PER_MINUTE = 600_000_000
+
+SERIES_LABEL = "TV Series"
+# Bump when the metadata built from the same document changes, so updates re-upsert every movie
+METADATA_VERSION = 2
 
 # Define the embedding model
 embedding_model = EMBEDDING_MODEL
@@ -23,10 +38,11 @@ ollama_url = OLLAMA_BASE_URL
 # ...existing ChromaDBEmbeddingFunction class...
 class ChromaDBEmbeddingFunction:
     """
-    Custom embedding function for ChromaDB using embeddings from Ollama.
+    Custom embedding function for ChromaDB using embeddings from Ollama,
+    served from the on-disk embedding cache where possible.
     """
     def __init__(self, langchain_embeddings):
-        self.langchain_embeddings = langchain_embeddings
+        self.langchain_embeddings = with_embedding_cache(langchain_embeddings)
 
     def __call__(self, input):
         # Ensure the input is in a list format for processing
@@ -34,125 +50,276 @@ class ChromaDBEmbeddingFunction:
             input = [input]
         return self.langchain_embeddings.embed_documents(input)
 
-def load_movie_json(json_file: Path):
-    try:
-        with json_file.open("r", encoding="utf-8") as f:
-            raw_data = json.load(f)
+def items_files(libraries: Optional[List[str]] = None) -> List[Path]:
+    """
+    Per-library Jellyfin snapshots, only the named libraries if given. Falls
+    back to per-library NDJSON exports from older versions, then to the
+    single-file export and the legacy single-document JSON.
+    """
+    from jellyseek.jellyfin_export.main import LIBRARIES_DIRNAME, library_file
+    from jellyseek.jellyfin_export.snapshot import SNAPSHOT_SUFFIX
 
-        data = raw_data.get("Items", [])
-        if not data:
-            raise ValueError("No movie items found in the JSON file")
+    if libraries:
+        return [library_file(JELLYFIN_DATA_PATH, name) for name in libraries]
+    libraries_dir = Path(JELLYFIN_DATA_PATH) / LIBRARIES_DIRNAME
+    exports = sorted(libraries_dir.glob(f"*{SNAPSHOT_SUFFIX}")) or sorted(libraries_dir.glob("*.ndjson"))
+    if exports:
+        return exports
 
-        print(f"Found {len(data)} total items")
+    for filename in (f"jellyfin_items{SNAPSHOT_SUFFIX}", "jellyfin_items.ndjson", "jellyfin_items.json"):
+        path = Path(JELLYFIN_DATA_PATH) / filename
+        if path.exists():
+            return [path]
+    return [Path(JELLYFIN_DATA_PATH) / f"jellyfin_items{SNAPSHOT_SUFFIX}"]
 
-        # Create unique movie entries
-        unique: "OrderedDict[str, dict]" = OrderedDict()
-        for item in data:
-            if not isinstance(item, dict):
-                print(f"Skipping non-dict item: {type(item)}")
-                continue
-                
-            # Use Name instead of Title for Jellyfin API
-            title = item.get("Name")
-            if not title:
-                print(f"Skipping item without name: {item}")
-                continue
+def iter_items(json_file: Path):
+    """Yield Jellyfin items one at a time from a snapshot, an NDJSON export or a legacy JSON file"""
+    from jellyseek.jellyfin_export.snapshot import SNAPSHOT_SUFFIX, Snapshot
 
-            year = ""
-            if date_str := item.get("PremiereDate"):
-                try:
-                    year = str(datetime.fromisoformat(date_str.rstrip("Z")).year)
-                except ValueError:
-                    pass
-            
-            key = f"{slug(str(title))}:{year}"
-            unique[key] = item
+    if json_file.suffix == SNAPSHOT_SUFFIX:
+        with Snapshot(json_file) as snapshot:
+            yield from snapshot
+        return
+    with json_file.open("r", encoding="utf-8") as f:
+        if json_file.suffix == ".json":
+            yield from json.load(f).get("Items", [])
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
 
-        print(f"\nFound {len(unique)} unique movies after deduplication")
+def premiere_year(date_str) -> int:
+    """Year of an ISO PremiereDate, 0 when missing or malformed"""
+    if isinstance(date_str, str) and date_str[:4].isdigit() and date_str[4:5] in ("-", ""):
+        return int(date_str[:4])
+    return 0
 
-        documents, ids, metadatas = [], [], []
-        for item in unique.values():
-            # Use Name instead of Title throughout
-            title = str(item.get("Name", "Unknown")).strip()
-            plot = str(item.get("Overview", "No plot available"))  # Also changed Plot to Overview
-            year_from = ""
-            
-            if date_str := item.get("PremiereDate"):
-                try:
-                    year_from = str(datetime.fromisoformat(date_str.rstrip("Z")).year)
-                except ValueError:
-                    pass
-
-            doc_text = (
-                f"Title: {title}\n"
-                f"Year: {year_from or 'Unknown'}\n"
-                f"Genres: {', '.join(map(str, item.get('Genres', []) or ['Unknown']))}\n"
-                f"Tags: {', '.join(map(str, item.get('Tags', []) or ['None']))}\n"
-                f"Actors: {', '.join(map(str, (item.get('Actors', []) or [])[:5]))}\n"
-                f"Critic Rating: {item.get('CriticRating', 'Not Rated')}\n"
-                f"Official Rating: {item.get('OfficialRating', 'Not Rated')}\n"
-                f"Runtime: {item.get('RunTimeTicks', 'Unknown')} minutes\n"
-                f"Plot: {plot}"
-            )
+def runtime_minutes(ticks) -> Optional[int]:
+    return round(ticks / TICKS_PER_MINUTE) if isinstance(ticks, (int, float)) and ticks > 0 else None
 
-            documents.append(doc_text)
-            ids.append(f"{slug(title)}_{year_from or uuid.uuid4().hex}")
-            
-            raw_meta = {
-                "title": title,
-                "year": int(year_from) if year_from else 0,
-                "genres": ", ".join(map(str, item.get("Genres", []))),
-                "critic_rating": item.get("CriticRating"),
-                "official_rating": item.get("OfficialRating"),
-                "runtime_minutes": item.get("RunTimeTicks")  # Changed to RunTimeTicks
-            }
-            metadatas.append(clean_metadata(raw_meta))
-
-        print(f"Successfully processed {len(documents)} movies")
-        return documents, ids, metadatas
+def load_movie_json(json_files: Union[Path, List[Path]]):
+    """Parse the exports once and build documents, IDs and metadata from them"""
+    if isinstance(json_files, Path):
+        json_files = [json_files]
+    # Parsing allocates one big graph of small objects that the cycle collector
+    # would otherwise rescan again and again, and none of it is cyclic
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        items = [item for json_file in json_files for item in iter_items(json_file)]
+        if not items:
+            # An emptied library is a valid export, callers decide whether that is an error
+            print("No movie items found in the exports")
+            return [], [], []
+        return build_documents(items)
 
     except Exception as e:
         print(f"Error processing movie data: {e}")
         import traceback
         traceback.print_exc()
         return [], [], []
+    finally:
+        if collecting:
+            gc.enable()
 
-def slug(s: str) -> str:
-    """lower-case, accent-fold, replace non-alphanum with underscores"""
-    s = unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode()
-    return re.sub(r"[^a-z0-9]+", "_", s.lower()).strip("_")
-
-def clean_metadata(d: dict) -> dict:
+def build_documents(items: list):
     """
-    Return a copy containing only keys whose values are
-    str | int | float | bool and not None.
+    Documents, IDs and metadata for every unique title among the items.
+    Each field is derived column by column so dates, slugs and runtimes
+    are computed a single time per item.
     """
-    out = {}
-    for k, v in d.items():
-        if v is None:
-            continue                      # skip entirely
-        if isinstance(v, bool):
-            out[k] = v
-        elif isinstance(v, (int, float, str)):
-            out[k] = v
+    # Use Name instead of Title for Jellyfin API
+    rows = []
+    for item in items:
+        if not isinstance(item, dict):
+            print(f"Skipping non-dict item: {type(item)}")
+        elif not item.get("Name"):
+            print(f"Skipping item without name: {item}")
         else:
-            out[k] = str(v)               # final safety net
-    return out
+            rows.append(item)
+
+    titles = [str(item["Name"]).strip() for item in rows]
+    years = [premiere_year(item.get("PremiereDate")) for item in rows]
+    kinds = [item.get("Type") or "Movie" for item in rows]
+    keys = [f"{kind}:{slug(title)}:{year or ''}" for kind, title, year in zip(kinds, titles, years)]
+
+    # Later duplicates win, the first one fixes the position
+    latest = {}
+    for i, key in enumerate(keys):
+        latest[key] = i
+    keep = list(latest.values())
+
+    print(f"Found {len(items)} total items")
+    print(f"\nFound {len(keep)} unique movies after deduplication")
+
+    # Pull each field out as a column once, then build every output from the columns
+    kept = [rows[i] for i in keep]
+    titles = [titles[i] for i in keep]
+    years = [years[i] for i in keep]
+    kinds = [kinds[i] for i in keep]
+    genre_lists = [item.get("Genres") or [] for item in kept]
+    genres = [", ".join(map(str, names)) for names in genre_lists]
+    tags = [", ".join(map(str, item.get("Tags") or [])) for item in kept]
+    actors = [", ".join(map(str, (item.get("Actors") or [])[:5])) for item in kept]
+    minutes = [runtime_minutes(item.get("RunTimeTicks")) for item in kept]
+    critic_ratings = [item.get("CriticRating") for item in kept]
+    official_ratings = [item.get("OfficialRating") for item in kept]
+    libraries = [item.get("LibraryName") for item in kept]
+    item_types = [item.get("Type") for item in kept]
+
+    # Series get a marker line, movie documents stay as they were
+    series_line = f"Type: {SERIES_LABEL}\n"
+    documents = [
+        f"Title: {title}\n"
+        f"{series_line if kind == 'Series' else ''}"
+        f"Year: {year or 'Unknown'}\n"
+        f"Genres: {genre or 'Unknown'}\n"
+        f"Tags: {tag or 'None'}\n"
+        f"Actors: {actor}\n"
+        f"Critic Rating: {item.get('CriticRating', 'Not Rated')}\n"
+        f"Official Rating: {item.get('OfficialRating', 'Not Rated')}\n"
+        f"Runtime: {f'{minute} minutes' if minute else 'Unknown'}\n"
+        f"Plot: {item.get('Overview', 'No plot available')}"
+        for item, title, year, kind, genre, tag, actor, minute
+        in zip(kept, titles, years, kinds, genres, tags, actors, minutes)
+    ]
+    # Prefer the Jellyfin item Id, otherwise derive one from the dedup key so it is stable across runs
+    ids = [str(item.get("Id") or keys[i].lower().replace(":", "_")) for item, i in zip(kept, keep)]
+    # Everything else in the metadata is derived from the document text
+    hashes = [
+        content_hash(document, METADATA_VERSION, library, item_type)
+        for document, library, item_type in zip(documents, libraries, item_types)
+    ]
+
+    metadatas = list(map(
+        build_metadata, titles, years, genres, genre_lists, critic_ratings, official_ratings,
+        minutes, libraries, item_types, hashes
+    ))
+
+    print(f"Successfully processed {len(documents)} movies")
+    return documents, ids, metadatas
+
+def build_metadata(title, year, genres, genre_list, critic_rating, official_rating,
+                   minutes, library, item_type, digest) -> dict:
+    """Metadata for one movie, only fields with a value are stored"""
+    metadata = {"title": title, "year": year, "genres": genres, **genre_flags(genre_list)}
+    if critic_rating is not None:
+        metadata["critic_rating"] = critic_rating
+    if official_rating is not None:
+        metadata["official_rating"] = str(official_rating)
+    if minutes:
+        metadata["runtime_minutes"] = minutes
+    if library:
+        metadata["library"] = library
+    if item_type:
+        metadata["item_type"] = item_type
+    metadata["content_hash"] = digest
+    return metadata
+
+def library_names(names: List[str]) -> List[str]:
+    """Library names as Jellyfin spells them, the names given to /update may differ in case"""
+    from jellyseek.jellyfin_export.main import find_library
+    spelled = []
+    for name in names:
+        try:
+            spelled.append(find_library(name)[1]["name"])
+        except ValueError:
+            spelled.append(name)
+    return spelled
+
+def content_hash(text: str, *extra) -> str:
+    """sha256 of the document text and any extra values, used to detect changed movies"""
+    digest = hashlib.sha256(text.encode("utf-8"))
+    if extra:
+        digest.update("\x1f".join(map(str, extra)).encode("utf-8"))
+    return digest.hexdigest()
+
+def genre_flags(genres) -> dict:
+    """Per-genre boolean fields, Chroma can't filter inside the joined genres string"""
+    return {genre_field(str(genre)): True for genre in genres or []}
+
+def embed_batch(embedding, documents, max_retries: int = EMBEDDING_MAX_RETRIES):
+    """Embed one batch of documents, retrying with exponential backoff"""
+    for attempt in range(max_retries + 1):
+        try:
+            return embedding(documents)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = 2 ** attempt
+            print(f"\nEmbedding batch failed ({e}), retrying in {delay}s...")
+            time.sleep(delay)
+
+def embed_and_store(collection, embedding, documents, ids, metadatas,
+                    keyword_index: BM25Index = None,
+                    batch_size: int = EMBEDDING_BATCH_SIZE,
+                    concurrency: int = EMBEDDING_CONCURRENCY) -> int:
+    """
+    Embed documents in batches on a thread pool and upsert each batch
+    as soon as it finishes, adding stored documents to keyword_index.
+    Returns the number of documents stored.
+    """
+    batches = [
+        range(start, min(start + batch_size, len(documents)))
+        for start in range(0, len(documents), batch_size)
+    ]
+    stored = failed = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            # Carry the caller's context so a background sync still collects retry messages
+            pool.submit(contextvars.copy_context().run, embed_batch, embedding, [documents[i] for i in batch]): batch
+            for batch in batches
+        }
+        # Writes stay on this thread, only the Ollama calls run in parallel
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                vectors = future.result()
+            except Exception as e:
+                failed += len(batch)
+                print(f"\nSkipping batch of {len(batch)} movies: {str(e)}")
+                continue
+
+            collection.upsert(
+                ids=[ids[i] for i in batch],
+                documents=[documents[i] for i in batch],
+                metadatas=[metadatas[i] for i in batch],
+                embeddings=vectors
+            )
+            if keyword_index is not None:
+                for i in batch:
+                    keyword_index.add(ids[i], documents[i])
+            stored += len(batch)
+            print(f"\rEmbedded {stored}/{len(documents)} movies", end="", flush=True)
+
+    print()
+    if failed:
+        print(f"Warning: {failed} movies could not be embedded. Run /update to retry them.")
+    return stored
 
 def generate_database(force_update: bool = False):
-    """Main function to generate the vector database"""
+    """
+    Main function to generate the vector database. The new database is built
+    in a shadow collection and swapped in when complete, so the current one
+    keeps answering queries until then.
+    """
+    from langchain_ollama import OllamaEmbeddings
+
     try:
-        # Initialize ChromaDB client with configured path
-        chroma_client = chromadb.PersistentClient(path=CHROMADB_PATH)
+        validate_config()
+
+        # Initialize the vector store client with configured path
+        chroma_client = open_client()
         
-        collection_name = MOVIES_COLLECTION_NAME
+        live_name = active_collection_name()
         try:
-            collection = chroma_client.get_collection(name=collection_name)
+            collection = chroma_client.get_collection(name=live_name)
             if not force_update:
                 doc_count = collection.count()
                 print(f"\nFound existing database with {doc_count} documents.")
                 while True:
-                    choice = input("Do you want to delete the existing database and create a new one? (y/n): ").strip().lower()
+                    choice = input("Do you want to rebuild the existing database? (y/n): ").strip().lower()
                     if choice in ['y', 'n']:
                         break
                     print("Invalid choice. Please enter 'y' or 'n'.")
@@ -161,12 +328,17 @@ def generate_database(force_update: bool = False):
                     print("Keeping existing database. Exiting...")
                     return
             
-            print("\nDeleting existing database...")
-            chroma_client.delete_collection(collection_name)
-            print("Database deleted successfully.")
+            print("\nRebuilding database, the current one stays available until it is done...")
         except ValueError:
             # Collection doesn't exist yet
             print("\nNo existing database found. Creating new database...")
+
+        # Drop whatever the previous rebuild left in the shadow collection
+        collection_name = shadow_collection_name(live_name)
+        try:
+            chroma_client.delete_collection(collection_name)
+        except ValueError:
+            pass
         
         # Initialize embedding function
         embedding = ChromaDBEmbeddingFunction(
@@ -184,22 +356,124 @@ def generate_database(force_update: bool = False):
         )
         
         # Load and process movies from configured data path
-        json_path = Path(JELLYFIN_DATA_PATH) / 'jellyfin_items.json'
-        if not json_path.exists():
-            raise FileNotFoundError(f"Movie data not found at: {json_path}")
+        json_paths = [path for path in items_files() if path.exists()]
+        if not json_paths:
+            raise FileNotFoundError(f"Movie data not found at: {JELLYFIN_DATA_PATH}")
 
-        documents, doc_ids, metadatas = load_movie_json(json_path)
+        documents, doc_ids, metadatas = load_movie_json(json_paths)
         if not documents:
             raise ValueError("No valid movie documents were generated")
 
         # Add to collection
-        collection.add(documents=documents, ids=doc_ids, metadatas=metadatas)
-        print(f"Successfully added {len(documents)} movies to the database.")
+        keyword_index = BM25Index()
+        stored = embed_and_store(collection, embedding, documents, doc_ids, metadatas, keyword_index)
+        if not stored:
+            raise ValueError("No movies could be embedded, keeping the current database")
+        save_keyword_index(collection_name, keyword_index)
+        print("Precomputing similar movies...")
+        refresh_similarity_graph(collection, collection_name)
+
+        # Switch readers over to the new collection in one step
+        set_active_collection_name(collection_name)
+        bump_library_version()
+        print(f"Successfully added {stored} movies to the database.")
         return True
 
     except Exception as e:
         print(f"Error generating database: {str(e)}")
         return False
 
+def update_database(libraries: Optional[List[str]] = None):
+    """
+    Incrementally sync the vector database with the exported Jellyfin data.
+    Only new or changed movies are embedded, removed movies are deleted.
+    With library names only those libraries' partitions are compared.
+    Falls back to a full build when no collection exists yet.
+    """
+    from langchain_ollama import OllamaEmbeddings
+
+    try:
+        validate_config()
+
+        chroma_client = open_client()
+
+        embedding = ChromaDBEmbeddingFunction(
+            OllamaEmbeddings(
+                model=embedding_model,
+                base_url=ollama_url
+            )
+        )
+
+        collection_name = active_collection_name()
+        try:
+            collection = chroma_client.get_collection(name=collection_name, embedding_function=embedding)
+        except ValueError:
+            print("\nNo existing database found. Creating new database...")
+            return generate_database(force_update=True)
+
+        paths = items_files(libraries)
+        json_paths = [path for path in paths if path.exists()]
+        if not json_paths:
+            raise FileNotFoundError(f"Movie data not found at: {JELLYFIN_DATA_PATH}")
+
+        documents, doc_ids, metadatas = load_movie_json(json_paths)
+        # A named library may have been emptied, its partition is then cleared below
+        if not documents and not libraries:
+            raise ValueError("No valid movie documents were generated")
+
+        # Compare against what the collection (or the libraries' partitions) already holds.
+        # The partitions come from the requested names, not the loaded items, which may be none
+        where = None
+        if libraries:
+            names = [name for name, path in zip(libraries, paths) if path.exists()]
+            where = {"library": {"$in": sorted(library_names(names))}}
+        existing = collection.get(where=where, include=["metadatas"])
+        existing_hashes = {
+            doc_id: (meta or {}).get("content_hash")
+            for doc_id, meta in zip(existing["ids"], existing["metadatas"])
+        }
+
+        changed = [
+            i for i, doc_id in enumerate(doc_ids)
+            if existing_hashes.get(doc_id) != metadatas[i]["content_hash"]
+        ]
+        current_ids = set(doc_ids)
+        removed = [doc_id for doc_id in existing_hashes if doc_id not in current_ids]
+
+        keyword_index = get_keyword_index(collection_name)
+        if not len(keyword_index):
+            # No keyword index yet, index the unchanged movies too
+            for i, doc_id in enumerate(doc_ids):
+                if existing_hashes.get(doc_id) == metadatas[i]["content_hash"]:
+                    keyword_index.add(doc_id, documents[i])
+
+        if removed:
+            collection.delete(ids=removed)
+            for doc_id in removed:
+                keyword_index.remove(doc_id)
+        stored = 0
+        if changed:
+            stored = embed_and_store(
+                collection,
+                embedding,
+                [documents[i] for i in changed],
+                [doc_ids[i] for i in changed],
+                [metadatas[i] for i in changed],
+                keyword_index
+            )
+        save_keyword_index(collection_name, keyword_index)
+        if stored or removed or not len(get_similarity_graph(collection_name)):
+            refresh_similarity_graph(collection, collection_name, [doc_ids[i] for i in changed] + removed)
+        if stored or removed:
+            bump_library_version()
+
+        print(f"Database updated: {stored} new or changed, {len(removed)} removed, "
+              f"{len(documents) - len(changed)} unchanged.")
+        return stored == len(changed)
+
+    except Exception as e:
+        print(f"Error updating database: {str(e)}")
+        return False
+
 if __name__ == "__main__":
     generate_database()
\ No newline at end of file
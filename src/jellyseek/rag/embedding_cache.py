@@ -0,0 +1,121 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import List, Optional
+from jellyseek.rag.config import CHROMADB_PATH, EMBEDDING_CACHE_SIZE
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model, sha256(text)).
+    Vectors are stored as float32 blobs in SQLite and the least recently
+    used entries are evicted once max_entries is exceeded.
+    """
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return cached vectors in input order, None for misses"""
+        hashes = [self.text_hash(t) for t in texts]
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? "
+                    f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk]
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, h) for h in found]
+                )
+                self._conn.commit()
+        return [array("f", found[h]).tolist() if h in found else None for h in hashes]
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Store vectors and evict the least recently used entries over the limit"""
+        now = time.time()
+        rows = [
+            (model, self.text_hash(t), array("f", v).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+class CachedEmbeddings:
+    """
+    Wraps a LangChain embeddings object so repeated texts are served
+    from the EmbeddingCache and only misses reach Ollama.
+    """
+    def __init__(self, langchain_embeddings, cache: EmbeddingCache, model: str):
+        self.langchain_embeddings = langchain_embeddings
+        self.cache = cache
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(self.model, texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            fresh = dict(zip(missing, self.langchain_embeddings.embed_documents(missing)))
+            self.cache.put_many(self.model, list(fresh), list(fresh.values()))
+            vectors = [v if v is not None else fresh[t] for t, v in zip(texts, vectors)]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Shared cache stored under CHROMADB_PATH, None when disabled"""
+    global _cache
+    if EMBEDDING_CACHE_SIZE <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            os.makedirs(CHROMADB_PATH, exist_ok=True)
+            _cache = EmbeddingCache(os.path.join(CHROMADB_PATH, "embedding_cache.sqlite3"), EMBEDDING_CACHE_SIZE)
+        return _cache
+
+def with_embedding_cache(langchain_embeddings):
+    """Put the shared embedding cache in front of a LangChain embeddings object"""
+    cache = get_embedding_cache()
+    if cache is None or isinstance(langchain_embeddings, CachedEmbeddings):
+        return langchain_embeddings
+    return CachedEmbeddings(langchain_embeddings, cache, langchain_embeddings.model)
@@ -0,0 +1,201 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import List, Optional
+
+SLUG_RE = re.compile(r"[^a-z0-9]+")
+
+def slug(s: str) -> str:
+    """lower-case, accent-fold, replace non-alphanum with underscores"""
+    if s.isascii():
+        return SLUG_RE.sub("_", s.lower()).strip("_")
+    s = unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode()
+    return SLUG_RE.sub("_", s.lower()).strip("_")
+
+@lru_cache(maxsize=None)
+def genre_field(genre: str) -> str:
+    """Metadata key holding the boolean flag for a genre, shared by the indexer and the filters"""
+    return f"genre_{slug(genre)}"
+
+# Genre names as Jellyfin reports them, with the words that name them outright.
+# These become where clauses.
+GENRE_SYNONYMS = {
+    "Action": ["action"],
+    "Adventure": ["adventure", "adventures"],
+    "Animation": ["animation", "animated"],
+    "Comedy": ["comedy", "comedies", "comedic"],
+    "Crime": ["crime"],
+    "Documentary": ["documentary", "documentaries"],
+    "Drama": ["drama", "dramas"],
+    "Family": ["family"],
+    "Fantasy": ["fantasy"],
+    "History": ["history", "historical"],
+    "Horror": ["horror"],
+    "Music": ["music"],
+    "Mystery": ["mystery", "mysteries"],
+    "Romance": ["romance", "romantic"],
+    "Science Fiction": ["science fiction", "sci-fi", "scifi", "sci fi"],
+    "Thriller": ["thriller", "thrillers"],
+    "War": ["war"],
+    "Western": ["western", "westerns"],
+}
+
+# Words that only suggest a genre. A heist movie may be filed under Thriller and a
+# kids movie under Animation, so these only boost matching movies when reranking.
+GENRE_HINTS = {
+    "Animation": ["cartoon", "cartoons", "anime"],
+    "Comedy": ["funny", "romcom", "rom-com"],
+    "Crime": ["heist", "gangster", "gangsters", "mob", "mafia"],
+    "Family": ["kids", "children"],
+    "Horror": ["scary"],
+    "Music": ["musical", "musicals"],
+    "Mystery": ["whodunit"],
+    "Romance": ["romcom", "rom-com"],
+}
+
+def genre_patterns(synonyms: dict) -> list:
+    return [
+        (genre, re.compile(r"\b(?:" + "|".join(re.escape(word) for word in words) + r")\b"))
+        for genre, words in synonyms.items()
+    ]
+
+GENRE_PATTERNS = genre_patterns(GENRE_SYNONYMS)
+GENRE_HINT_PATTERNS = genre_patterns(GENRE_HINTS)
+
+# "1980s", "'80s", "the (early/mid/late) 80s" or "80s (horror) movies", but not "in my 30s"
+DECADE_RE = re.compile(
+    r"\b(19|20)(\d)0'?s\b"
+    r"|(?:(?<![\w'])'|\bthe\s+(?:early\s+|mid\s+|mid-|late\s+)?)(\d)0'?s\b"
+    r"|\b(\d)0'?s(?=\s+(?:\w+\s+)?(?:movies?|films?|shows?|series|tv|cinema|classics?)\b)"
+)
+YEAR_RE = re.compile(r"\b(from|in|before|after|since|pre|post)[\s-]+((?:19|20)\d\d)\b")
+RUNTIME_RE = re.compile(
+    r"\b(under|less than|shorter than|below|at most|over|more than|longer than|at least)\s+"
+    r"(\d+(?:\.\d+)?|an?|one|two|three)\s*(hours?|hrs?|h|minutes?|mins?|m)\b"
+)
+OFFICIAL_RATING_RE = re.compile(r"\b(?:rated\s+(g|pg-13|pg|r|nc-17)|(g|pg-13|pg|r|nc-17)[\s-]rated|(pg-13|pg|nc-17))(?![\w-])")
+SERIES_RE = re.compile(
+    r"\b(tv shows?|tv series|television|sitcoms?|miniseries|(?:shows?|series) to binge|binge[- ]?(?:watch|worthy))\b"
+)
+ACCLAIMED_RE = re.compile(r"\b(highly rated|well reviewed|well-reviewed|critically acclaimed|acclaimed|top rated|top-rated)\b")
+
+NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3}
+
+def extract_filters(question: str, libraries: Optional[List[str]] = None) -> Optional[dict]:
+    """
+    Turn constraints in the question (decades, years, genres, runtime,
+    official and critic rating, TV series, and "<name> library" for one
+    of the given libraries) into a Chroma where clause.
+    Returns None when the question has no recognisable constraints.
+    """
+    text = question.lower()
+    conditions: List[dict] = []
+
+    if match := DECADE_RE.search(text):
+        century, decade = match.group(1), next(group for group in match.groups()[1:] if group)
+        if century:
+            start = int(century + decade + "0")
+        else:
+            start = (1900 if int(decade) >= 3 else 2000) + int(decade) * 10
+        conditions += [{"year": {"$gte": start}}, {"year": {"$lte": start + 9}}]
+    elif match := YEAR_RE.search(text):
+        word, year = match.group(1), int(match.group(2))
+        if word in ("before", "pre"):
+            conditions += [{"year": {"$gt": 0}}, {"year": {"$lt": year}}]
+        elif word in ("after", "post"):
+            conditions.append({"year": {"$gt": year}})
+        elif word == "since":
+            conditions.append({"year": {"$gte": year}})
+        else:
+            conditions.append({"year": {"$eq": year}})
+
+    for genre, pattern in GENRE_PATTERNS:
+        if pattern.search(text):
+            conditions.append({genre_field(genre): {"$eq": True}})
+
+    if match := RUNTIME_RE.search(text):
+        comparison, amount, unit = match.groups()
+        amount = NUMBER_WORDS.get(amount) or float(amount)
+        minutes = round(amount * 60) if unit.startswith("h") else round(amount)
+        if comparison in ("under", "less than", "shorter than", "below", "at most"):
+            conditions += [{"runtime_minutes": {"$gt": 0}}, {"runtime_minutes": {"$lte": minutes}}]
+        else:
+            conditions.append({"runtime_minutes": {"$gte": minutes}})
+
+    if match := OFFICIAL_RATING_RE.search(text):
+        rating = next(group for group in match.groups() if group)
+        conditions.append({"official_rating": {"$eq": rating.upper()}})
+
+    if ACCLAIMED_RE.search(text):
+        conditions.append({"critic_rating": {"$gte": 70}})
+
+    # A bare "series" or "shows" stays a search term, "the Harry Potter series" is films
+    if SERIES_RE.search(text):
+        conditions.append({"item_type": {"$eq": "Series"}})
+
+    # Longest name first, "Kids Movies library" is not the "Movies" library
+    for library in sorted(libraries or [], key=len, reverse=True):
+        if re.search(rf"\b{re.escape(library.lower())}\s+(?:library|collection)\b", text):
+            conditions.append({"library": {"$eq": library}})
+            break
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+def restrict(where: Optional[dict], condition: Optional[dict]) -> Optional[dict]:
+    """A where clause that also requires condition"""
+    if not where or not condition:
+        return where or condition
+    clauses = where["$and"] if "$and" in where else [where]
+    return {"$and": clauses + [condition]}
+
+def genre_hints(question: str) -> List[str]:
+    """Genres the question suggests without naming them, used as soft reranking signals"""
+    text = question.lower()
+    return [genre for genre, pattern in GENRE_HINT_PATTERNS if pattern.search(text)]
+
+def compare(value, operator: str, operand) -> bool:
+    """Apply one where-clause operator to a metadata value"""
+    if value is None:
+        return False
+    try:
+        if operator == "$eq":
+            return value == operand
+        if operator == "$ne":
+            return value != operand
+        if operator == "$gt":
+            return value > operand
+        if operator == "$gte":
+            return value >= operand
+        if operator == "$lt":
+            return value < operand
+        if operator == "$lte":
+            return value <= operand
+        if operator == "$in":
+            return value in operand
+        if operator == "$nin":
+            return value not in operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported where operator: {operator}")
+
+def matches_where(metadata: dict, where: Optional[dict]) -> bool:
+    """Evaluate a Chroma where clause against one metadata dict"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            if not all(compare(metadata.get(key), operator, operand) for operator, operand in condition.items()):
+                return False
+        elif not compare(metadata.get(key), "$eq", condition):
+            return False
+    return True
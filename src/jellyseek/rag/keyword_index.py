@@ -0,0 +1,131 @@
+import heapq
+import math
+import os
+import pickle
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+from jellyseek.rag.config import CHROMADB_PATH
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """lower-case, accent-fold and split on anything that isn't alphanumeric"""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return TOKEN_RE.findall(text.lower())
+
+class BM25Index:
+    """
+    In-process inverted index scored with BM25. Documents can be added
+    and removed one at a time so it follows incremental database updates.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, doc_id: str, text: str):
+        """Index a document, replacing any previous version with the same id"""
+        self.remove(doc_id)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.doc_terms[doc_id] = tuple(counts)
+        length = sum(counts.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+
+    def remove(self, doc_id: str):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            docs = self.postings[term]
+            del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        """Return up to n_results (doc_id, score) pairs, best first"""
+        if not self.doc_lengths:
+            return []
+        n_docs = len(self.doc_lengths)
+        avg_length = self.total_length / n_docs
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+    def save(self, path: str):
+        """Write the index atomically next to the ChromaDB files"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.__dict__, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        index = cls()
+        with open(path, "rb") as f:
+            index.__dict__.update(pickle.load(f))
+        return index
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """Merge ranked id lists, scoring each id by the sum of 1 / (k + rank)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+# Cached indexes with the version of the file they were loaded from
+_indexes: Dict[str, Tuple[Optional[Tuple[int, int]], BM25Index]] = {}
+_indexes_lock = threading.Lock()
+
+def file_version(path: str) -> Optional[Tuple[int, int]]:
+    """Inode and mtime of a file, changes whenever it is replaced"""
+    try:
+        stat = os.stat(path)
+        return stat.st_ino, stat.st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def keyword_index_path(collection_name: str) -> str:
+    return os.path.join(CHROMADB_PATH, f"{collection_name}_keywords.pkl")
+
+def get_keyword_index(collection_name: str) -> BM25Index:
+    """
+    Shared index for a collection, loaded from disk on first use and again
+    whenever another process (an update or rebuild) replaces the file
+    """
+    path = keyword_index_path(collection_name)
+    version = file_version(path)
+    with _indexes_lock:
+        cached = _indexes.get(collection_name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        index = BM25Index.load(path) if version is not None else BM25Index()
+        _indexes[collection_name] = (version, index)
+        return index
+
+def save_keyword_index(collection_name: str, index: BM25Index):
+    """Persist an index and make it the shared one for the collection"""
+    path = keyword_index_path(collection_name)
+    index.save(path)
+    with _indexes_lock:
+        _indexes[collection_name] = (file_version(path), index)
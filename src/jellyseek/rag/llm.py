@@ -1,35 +1,218 @@
-from langchain_ollama import OllamaLLM
+from dataclasses import dataclass, field
+from functools import lru_cache
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set, Tuple
 from jellyseek.rag.config import (
     OLLAMA_BASE_URL,
+    OLLAMA_KEEP_ALIVE,
+    CONVERSATION_MAX_TOKENS,
     EMBEDDING_MODEL,
     GENERATION_MODEL,
     EMBEDDING_PROMPT,
-    GENERATION_PROMPT
+    GENERATION_PROMPT,
+    QUERY_REWRITE_MODE,
+    REWRITE_MODEL,
+    REWRITE_HEURISTIC_MAX_WORDS,
+    REWRITE_CACHE_SIZE
 )
 
+if TYPE_CHECKING:
+    from langchain_ollama import OllamaLLM
+
+QUESTION_WORDS = {
+    "what", "which", "who", "whom", "when", "where", "why", "how",
+    "is", "are", "can", "could", "do", "does", "should", "would",
+    "recommend", "suggest", "find", "show", "give", "any", "i", "i'm", "im"
+}
+
+# Appended to the conversation for every turn after the first. The first prompt
+# (instructions and movie documents) is never re-sent, so this is all Ollama
+# has to process before answering.
+FOLLOW_UP_TEMPLATE = """
+
+{documents}Follow-up question: {question}
+{movies}
+Answer the follow-up using the movies discussed so far, best fit first followed by the reasoning.
+Answer:"""
+
+@dataclass
+class GenerationStats:
+    """Timings for one streamed answer, in seconds"""
+    time_to_first_token: Optional[float]
+    total_time: float
+    chunks: int
+    prompt_tokens: Optional[int] = None
+
+@dataclass
+class Conversation:
+    """
+    One chat session. Keeps the movies the last answer was based on, so
+    follow-ups can narrow them locally, and the token state Ollama returned,
+    so each turn only sends its own question instead of the whole history.
+    """
+    ids: List[str] = field(default_factory=list)
+    documents: List[str] = field(default_factory=list)
+    metadatas: List[dict] = field(default_factory=list)
+    search_query: str = ""
+    # Token state after the last answer, None until the model has seen a prompt
+    context: Optional[List[int]] = None
+    # Movies whose documents are already part of that state
+    sent: Set[str] = field(default_factory=set)
+    turns: int = 0
+
+    @property
+    def continues(self) -> bool:
+        """Whether the next answer can build on the model's previous state"""
+        return self.context is not None and len(self.context) < CONVERSATION_MAX_TOKENS
+
+    def remember(self, ids: List[str], documents: List[str], metadatas: List[dict], search_query: str):
+        """Make these movies the ones follow-ups refer to"""
+        self.ids, self.documents, self.metadatas = list(ids), list(documents), list(metadatas)
+        self.search_query = search_query
+
+    def reset(self):
+        self.__init__()
+
+_templates: Dict[str, Tuple[int, str]] = {}
+_templates_lock = threading.Lock()
+
 def read_prompt_file(filename: str) -> str:
     with open(filename, 'r') as file:
         return file.read().strip()
 
+def load_prompt_template(filename: str) -> str:
+    """Return the prompt template, re-reading the file only when its mtime changes"""
+    mtime = os.stat(filename).st_mtime_ns
+    with _templates_lock:
+        cached = _templates.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        template = read_prompt_file(filename)
+        _templates[filename] = (mtime, template)
+        return template
+
+def get_llm(model: Optional[str] = None) -> "OllamaLLM":
+    """
+    Long-lived client per model. Reusing it keeps its pooled HTTP connections
+    alive, and keep_alive pins the model in Ollama's memory between turns.
+    """
+    # Resolve the default first, so get_llm() and get_llm(GENERATION_MODEL) share one client
+    return _create_llm(model or GENERATION_MODEL)
+
+@lru_cache(maxsize=None)
+def _create_llm(model: str) -> "OllamaLLM":
+    from langchain_ollama import OllamaLLM
+    return OllamaLLM(model=model, base_url=OLLAMA_BASE_URL, keep_alive=OLLAMA_KEEP_ALIVE)
+
+def is_keyword_query(query: str) -> bool:
+    """Short keyword-style queries ("alien ridley scott") embed well without a rewrite"""
+    words = query.split()
+    return (
+        0 < len(words) <= REWRITE_HEURISTIC_MAX_WORDS
+        and not query.rstrip().endswith("?")
+        and words[0].lower() not in QUESTION_WORDS
+    )
+
 def generate_search_query(original_query: str) -> str:
-    template = read_prompt_file(EMBEDDING_PROMPT)
+    """Turn the question into a search query according to QUERY_REWRITE_MODE"""
+    query = " ".join(original_query.split())
+    if QUERY_REWRITE_MODE == "off":
+        return query
+    if QUERY_REWRITE_MODE == "heuristic" and is_keyword_query(query):
+        return query
+    return rewrite_query(query)
+
+@lru_cache(maxsize=REWRITE_CACHE_SIZE)
+def rewrite_query(query: str) -> str:
+    """Rewrite the question with REWRITE_MODEL, repeated questions come from the cache"""
+    template = load_prompt_template(EMBEDDING_PROMPT)
     prompt = template.format(
-        generation_model=GENERATION_MODEL,
+        generation_model=REWRITE_MODEL,
         embedding_model=EMBEDDING_MODEL,
-        question=original_query
+        question=query
     )
     
-    llm = OllamaLLM(model=GENERATION_MODEL, base_url=OLLAMA_BASE_URL)
-    return llm.invoke(prompt).strip()
+    return get_llm(REWRITE_MODEL).invoke(prompt).strip()
 
-def generate_response(original_query: str, context: str) -> str:
-    template = read_prompt_file(GENERATION_PROMPT)
-    prompt = template.format(
+def build_response_prompt(original_query: str, context: str) -> str:
+    template = load_prompt_template(GENERATION_PROMPT)
+    return template.format(
         generation_model=GENERATION_MODEL,
         embedding_model=EMBEDDING_MODEL,
         context=context,
         question=original_query
     )
-    
-    llm = OllamaLLM(model=GENERATION_MODEL, base_url=OLLAMA_BASE_URL)
-    return llm.invoke(prompt)
\ No newline at end of file
+
+def build_follow_up_prompt(question: str, conversation: Conversation, ids: List[str],
+                           documents: List[str], metadatas: List[dict]) -> str:
+    """
+    Prompt for a turn that continues the conversation. Only documents the
+    model has not seen yet are included, the rest are named by title.
+    """
+    new_documents = [document for doc_id, document in zip(ids, documents) if doc_id not in conversation.sent]
+    titles = ", ".join(
+        f"{metadata.get('title', 'Unknown')} ({metadata['year']})" if metadata.get("year") else metadata.get("title", "Unknown")
+        for metadata in metadatas
+    )
+    return FOLLOW_UP_TEMPLATE.format(
+        documents=("More movies from the library:\n\n" + "\n\n".join(new_documents) + "\n\n") if new_documents else "",
+        question=question,
+        movies=f"Only consider these movies: {titles}." if titles else ""
+    )
+
+def converse(conversation: Conversation, question: str, ids: List[str], documents: List[str], metadatas: List[dict],
+             on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, GenerationStats]:
+    """
+    Answer one turn of a conversation. A new conversation starts with the
+    regular generation prompt, later turns append only the follow-up and pass
+    Ollama the previous token state, so time to first token stays flat as the
+    conversation grows. Restarts once CONVERSATION_MAX_TOKENS is reached.
+    """
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    if conversation.continues:
+        prompt = build_follow_up_prompt(question, conversation, ids, documents, metadatas)
+        state = {"context": conversation.context}
+    else:
+        conversation.context, conversation.sent = None, set()
+        prompt = build_response_prompt(question, "\n\n".join(documents))
+        state = {}
+
+    start = time.perf_counter()
+    first_token = None
+    chunks = 0
+
+    class TokenHandler(BaseCallbackHandler):
+        def on_llm_new_token(self, token: str, **kwargs):
+            nonlocal first_token, chunks
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            chunks += 1
+            if on_token:
+                on_token(token)
+
+    result = get_llm().generate([prompt], callbacks=[TokenHandler()], **state)
+    generation = result.generations[0][0]
+    info = generation.generation_info or {}
+
+    conversation.context = info.get("context") or None
+    conversation.sent.update(ids)
+    conversation.turns += 1
+    stats = GenerationStats(
+        time_to_first_token=first_token,
+        total_time=time.perf_counter() - start,
+        chunks=chunks,
+        prompt_tokens=info.get("prompt_eval_count")
+    )
+    return generation.text, stats
+
+def generate_response(original_query: str, context: str) -> str:
+    prompt = build_response_prompt(original_query, context)
+    return get_llm().invoke(prompt)
+
+async def agenerate_response(original_query: str, context: str) -> str:
+    """Async variant of generate_response, shares the client's async connection pool"""
+    prompt = build_response_prompt(original_query, context)
+    return await get_llm().ainvoke(prompt)
@@ -1,23 +1,13 @@
-from langchain_ollama import OllamaLLM, OllamaEmbeddings
-import chromadb
-import os
-from typing import Tuple, List, Dict
-from jellyseek.rag.config import (
-    OLLAMA_BASE_URL, 
-    EMBEDDING_MODEL, 
-    GENERATION_MODEL, 
-    EMBEDDING_PROMPT, 
-    GENERATION_PROMPT,
-    CHROMADB_PATH,
-    JELLYFIN_DATA_PATH
-)
-from jellyseek.jellyfin_export.main import fetch_items, save_items
-from jellyseek.rag.db_generator import generate_database
+import time
+from jellyseek.rag.answer_cache import get_answer_cache
+from jellyseek.rag.config import SIMILAR_EXPLAIN, STREAM_RESPONSES
 from jellyseek.rag.commands import create_command_handler
-from jellyseek.rag.database import initialize_database, query_database
-from jellyseek.rag.llm import generate_search_query, generate_response
-import json
-from pathlib import Path
+from jellyseek.rag.database import LazyDatabase
+from jellyseek.rag.llm import Conversation, converse
+from jellyseek.rag.pipeline import is_follow_up, retrieve, retrieve_follow_up, retrieve_similar
+from jellyseek.rag.similar import format_similar
+from jellyseek.rag.sync import BackgroundSync
+from jellyseek.rag.tracing import profiled, record, span
 
 def handle_empty_database(cmd_handler, collection, embedding, collection_name, chroma_client):
     """Handle case when database exists but is empty"""
@@ -26,6 +16,7 @@ def handle_empty_database(cmd_handler, collection, embedding, collection_name, c
         print("Cannot proceed without movies in the database. Exiting...")
         return False
         
+    # Nothing to answer from yet, so sync in the foreground
     print("\nFetching movies from Jellyfin...")
     return cmd_handler.handle("/update",
         collection=collection,
@@ -34,52 +25,129 @@ def handle_empty_database(cmd_handler, collection, embedding, collection_name, c
         chroma_client=chroma_client
     )
 
-def handle_command(cmd_handler, user_query, collection, embedding, collection_name, chroma_client):
+def handle_command(cmd_handler, user_query, collection=None, embedding=None, collection_name=None, chroma_client=None,
+                   sync=None, conversation=None):
     """Handle chat commands"""
     result = cmd_handler.handle(
         user_query,
         collection=collection,
         embedding=embedding,
         collection_name=collection_name,
-        chroma_client=chroma_client
+        chroma_client=chroma_client,
+        sync=sync,
+        conversation=conversation
     )
     return result is not None and result and user_query == '/quit'
 
-def handle_query(user_query, collection):
-    """Handle regular chat queries"""
-    search_query = generate_search_query(user_query)
-    retrieved_docs, _ = query_database(collection, search_query)
+def handle_query(user_query, collection, conversation=None):
+    """Handle regular chat queries, follow-ups build on the conversation"""
+    with profiled("query"):
+        start = time.perf_counter()
+        _handle_query(user_query, collection, conversation or Conversation())
+        record("query", time.perf_counter() - start)
+
+def _handle_query(user_query, collection, conversation):
+    follow_up = is_follow_up(user_query, conversation)
+    answer_cache = get_answer_cache()
+    if answer_cache and not follow_up:
+        with span("answer_cache"):
+            cached = answer_cache.lookup(user_query)
+        if cached:
+            # The model never saw this answer, so don't continue from it
+            conversation.reset()
+            print(f"\nAssistant: {cached}\n\n(cached answer)")
+            return
+
+    if follow_up:
+        retrieval = retrieve_follow_up(user_query, conversation)
+        if not retrieval.documents:
+            # Keep the conversation as it was, the next question may still be about those movies
+            print("\nAssistant: None of the movies from my previous answer match that.")
+            return
+    else:
+        retrieval = retrieve_similar(collection, user_query)
+        if retrieval and not SIMILAR_EXPLAIN:
+            conversation.remember(retrieval.ids, retrieval.documents, retrieval.metadatas, retrieval.search_query)
+            print(f"\nAssistant: {format_similar(retrieval.search_query, retrieval.metadatas)}")
+            return
+        retrieval = retrieval or retrieve(collection, user_query)
     
-    if not retrieved_docs:
+    if not retrieval.documents:
         print("No relevant movies found.")
         return
-        
-    response = generate_response(user_query, "\n\n".join(retrieved_docs))
-    print(f"\nAssistant: {response}")
+
+    conversation.remember(retrieval.ids, retrieval.documents, retrieval.metadatas, retrieval.search_query)
+    continued = conversation.continues
+    if not STREAM_RESPONSES:
+        with span("generate"):
+            response, stats = converse(conversation, user_query, retrieval.ids, retrieval.documents, retrieval.metadatas)
+        print(f"\nAssistant: {response}")
+    else:
+        print("\nAssistant: ", end="", flush=True)
+        response, stats = converse(
+            conversation, user_query, retrieval.ids, retrieval.documents, retrieval.metadatas,
+            lambda token: print(token, end="", flush=True)
+        )
+        record("generate", stats.total_time)
+        if stats.time_to_first_token is not None:
+            record("first_token", stats.time_to_first_token)
+        first_token = f"{stats.time_to_first_token:.2f}s" if stats.time_to_first_token is not None else "n/a"
+        prompt_tokens = f", {stats.prompt_tokens} prompt tokens" if stats.prompt_tokens is not None else ""
+        print(f"\n\n(first token {first_token}, total {stats.total_time:.2f}s{prompt_tokens})")
+
+    # Answers that depend on earlier turns aren't valid for the question alone
+    if answer_cache and not continued:
+        answer_cache.store(user_query, response)
 
 def chat_loop():
     """Main chat loop"""
-    # Initialize components
-    chroma_client, collection_name, embedding, collection = initialize_database()
+    # Open the database in the background so the prompt shows up right away
+    database = LazyDatabase().start()
+    sync = BackgroundSync().start_auto()
     cmd_handler = create_command_handler()
-    
-    # Check if collection is empty
-    if collection.count() == 0:
-        if not handle_empty_database(cmd_handler, collection, embedding, collection_name, chroma_client):
-            return
+    conversation = Conversation()
+    checked_empty = False
     
     print("\nMovie Chat Assistant Ready! (Type '/help' for available commands)")
     
     # Main chat loop
-    while True:
-        user_query = input("\nEnter your question about movies: ").strip()
+    try:
+        while True:
+            # Show what the background sync printed since the last prompt
+            for message in sync.drain():
+                print(f"[sync] {message}")
+
+            user_query = input("\nEnter your question about movies: ").strip()
+            if not user_query:
+                continue
+
+            # /help, /quit and the sync commands don't have to wait for the database
+            if user_query.startswith('/') and not cmd_handler.needs_database(user_query):
+                if handle_command(cmd_handler, user_query, sync=sync, conversation=conversation):
+                    break
+                continue
+
+            chroma_client, collection_name, embedding, collection = database.get()
+
+            # Check if collection is empty, unless a sync is already filling it
+            if not checked_empty and not sync.running:
+                checked_empty = True
+                if collection.count() == 0:
+                    if not handle_empty_database(cmd_handler, collection, embedding, collection_name, chroma_client):
+                        return
         
-        if user_query.startswith('/'):
-            if handle_command(cmd_handler, user_query, collection, embedding, collection_name, chroma_client):
-                break
-            continue
+            if user_query.startswith('/'):
+                if handle_command(cmd_handler, user_query, collection, embedding, collection_name, chroma_client, sync, conversation):
+                    break
+                continue
         
-        handle_query(user_query, collection)
+            handle_query(user_query, collection, conversation)
+    finally:
+        if sync.running:
+            print("Waiting for the library sync to finish...")
+        sync.stop()
+        for message in sync.drain():
+            print(f"[sync] {message}")
 
 if __name__ == "__main__":
-    chat_loop()
\ No newline at end of file
+    chat_loop()
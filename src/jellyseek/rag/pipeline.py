@@ -0,0 +1,152 @@
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from jellyseek.rag.answer_cache import get_answer_cache
+from jellyseek.rag.config import METADATA_FILTERS, RETRIEVAL_CANDIDATES, SIMILAR_EXPLAIN
+from jellyseek.rag.context import build_context
+from jellyseek.rag.database import search_movies
+from jellyseek.rag.filters import extract_filters, matches_where, restrict
+from jellyseek.rag.llm import Conversation, generate_search_query, generate_response
+from jellyseek.rag.similar import find_similar, format_similar
+from jellyseek.rag.tracing import profiled, record, span
+
+# Questions that refer back to the movies of the previous answer: they open
+# with a continuation word or point at those movies with a pronoun
+FOLLOW_UP_RE = re.compile(
+    r"^(?:and|but|what about|how about|only|just)\b|"
+    r"\b(?:those|these|them|which one|which ones)\b"
+)
+
+@dataclass
+class Retrieval:
+    """Movies retrieved for one question, with per-stage timings in seconds"""
+    question: str
+    search_query: str
+    ids: List[str]
+    documents: List[str]
+    metadatas: List[dict]
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def context(self) -> str:
+        return "\n\n".join(self.documents)
+
+@dataclass
+class Answer:
+    """A generated answer together with the retrieval it was based on"""
+    retrieval: Retrieval
+    text: Optional[str]
+    cached: bool = False
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        return self.retrieval.timings
+
+def retrieve(collection, user_query: str, n_results: int = RETRIEVAL_CANDIDATES,
+             library: Optional[str] = None) -> Retrieval:
+    """
+    Rewrite the question, extract metadata filters, over-retrieve n_results
+    candidates and assemble the best of them into a token-budgeted context.
+    A library name limits every search to that library.
+    """
+    from jellyseek.jellyfin_export.main import synced_library_names
+
+    timings = {}
+    start = time.perf_counter()
+    search_query = generate_search_query(user_query)
+    timings["rewrite"] = time.perf_counter() - start
+    record("rewrite", timings["rewrite"])
+
+    start = time.perf_counter()
+    names = synced_library_names() if METADATA_FILTERS or library else []
+    scope = None
+    if library:
+        library = next((name for name in names if name.lower() == library.lower()), library)
+        scope = {"library": {"$eq": library}}
+    where = restrict(extract_filters(user_query, names) if METADATA_FILTERS else None, scope)
+    ids, documents, metadatas = search_movies(collection, search_query, n_results, where)
+    if not ids and where != scope:
+        # The filters may be too strict, search the whole library (or the requested one) instead
+        ids, documents, metadatas = search_movies(collection, search_query, n_results, scope)
+    timings["search"] = time.perf_counter() - start
+    record("search", timings["search"])
+
+    start = time.perf_counter()
+    ids, documents, metadatas = build_context(user_query, ids, documents, metadatas)
+    timings["context"] = time.perf_counter() - start
+    record("context", timings["context"])
+
+    return Retrieval(user_query, search_query, ids, documents, metadatas, timings)
+
+def retrieve_similar(collection, user_query: str) -> Optional[Retrieval]:
+    """
+    Neighbours of the title in a "movies like X" question, read from the
+    precomputed similarity graph. None when the question names no known title.
+    """
+    start = time.perf_counter()
+    with span("similar"):
+        similar = find_similar(collection, user_query)
+    if not similar:
+        return None
+    title, ids, documents, metadatas = similar
+    timings = {"similar": time.perf_counter() - start}
+    return Retrieval(user_query, title, ids, documents, metadatas, timings)
+
+def is_follow_up(user_query: str, conversation: Conversation) -> bool:
+    """Whether the question is about the movies the conversation already holds"""
+    return bool(conversation.ids) and bool(FOLLOW_UP_RE.search(user_query.lower()))
+
+def retrieve_follow_up(user_query: str, conversation: Conversation) -> Retrieval:
+    """
+    Narrow the movies of the previous answer with the filters found in the
+    follow-up, without rewriting or searching. The result is empty when none
+    of them qualify, a follow-up about "those" must not be answered from others.
+    """
+    start = time.perf_counter()
+    where = extract_filters(user_query) if METADATA_FILTERS else None
+    keep = [i for i, metadata in enumerate(conversation.metadatas) if matches_where(metadata, where)]
+    timings = {"follow_up": time.perf_counter() - start}
+    record("follow_up", timings["follow_up"])
+    return Retrieval(
+        user_query,
+        conversation.search_query,
+        [conversation.ids[i] for i in keep],
+        [conversation.documents[i] for i in keep],
+        [conversation.metadatas[i] for i in keep],
+        timings
+    )
+
+def answer_query(collection, user_query: str) -> Answer:
+    """Run retrieval and generation without printing anything"""
+    with profiled("query"):
+        start = time.perf_counter()
+        answer = _answer_query(collection, user_query)
+        record("query", time.perf_counter() - start)
+        return answer
+
+def _answer_query(collection, user_query: str) -> Answer:
+    answer_cache = get_answer_cache()
+    if answer_cache:
+        start = time.perf_counter()
+        with span("answer_cache"):
+            cached = answer_cache.lookup(user_query)
+        if cached:
+            retrieval = Retrieval(user_query, user_query, [], [], [], {"cache": time.perf_counter() - start})
+            return Answer(retrieval, cached, cached=True)
+
+    retrieval = retrieve_similar(collection, user_query)
+    if retrieval and not SIMILAR_EXPLAIN:
+        return Answer(retrieval, format_similar(retrieval.search_query, retrieval.metadatas))
+
+    retrieval = retrieval or retrieve(collection, user_query)
+    if not retrieval.documents:
+        return Answer(retrieval, None)
+
+    start = time.perf_counter()
+    text = generate_response(user_query, retrieval.context)
+    retrieval.timings["generate"] = time.perf_counter() - start
+    record("generate", retrieval.timings["generate"])
+    if answer_cache:
+        answer_cache.store(user_query, text)
+    return Answer(retrieval, text)
@@ -0,0 +1,212 @@
+import asyncio
+import functools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Optional, Tuple
+from jellyseek.rag.config import SERVE_HOST, SERVE_PORT, SERVE_WORKERS, SERVE_MAX_PENDING
+from jellyseek.rag.database import initialize_database
+from jellyseek.rag.llm import agenerate_response
+from jellyseek.rag.pipeline import retrieve
+from jellyseek.rag.tracing import export_prometheus, record
+
+MAX_BODY_SIZE = 1024 * 1024
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+class QueryServer:
+    """
+    Minimal HTTP/1.1 JSON service on asyncio. Retrieval runs on a thread pool
+    and generation on the LLM client's async connection pool, so searches for
+    one request overlap generation for another. Requests beyond max_pending
+    are rejected with 503 instead of queueing without bound.
+    """
+    def __init__(self, collection, workers: int = SERVE_WORKERS, max_pending: int = SERVE_MAX_PENDING):
+        self.collection = collection
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jellyseek-search")
+        self.max_pending = max_pending
+        self.pending = 0
+        self.started = time.time()
+
+    async def search(self, body: dict) -> dict:
+        question = self._question(body)
+        loop = asyncio.get_running_loop()
+        retrieval = await loop.run_in_executor(
+            self.executor, functools.partial(retrieve, self.collection, question, library=self._library(body))
+        )
+        return {
+            "question": question,
+            "search_query": retrieval.search_query,
+            "ids": retrieval.ids,
+            "metadatas": retrieval.metadatas,
+            "timings": retrieval.timings
+        }
+
+    async def ask(self, body: dict) -> dict:
+        question = self._question(body)
+        loop = asyncio.get_running_loop()
+        retrieval = await loop.run_in_executor(
+            self.executor, functools.partial(retrieve, self.collection, question, library=self._library(body))
+        )
+        answer = None
+        if retrieval.documents:
+            start = time.perf_counter()
+            answer = await agenerate_response(question, retrieval.context)
+            retrieval.timings["generate"] = time.perf_counter() - start
+            record("generate", retrieval.timings["generate"])
+        return {
+            "question": question,
+            "answer": answer,
+            "ids": retrieval.ids,
+            "timings": retrieval.timings
+        }
+
+    async def health(self, body: dict) -> dict:
+        return {
+            "status": "ok",
+            "movies": self.collection.count(),
+            "pending": self.pending,
+            "uptime": time.time() - self.started
+        }
+
+    async def metrics(self, body: dict) -> str:
+        return export_prometheus()
+
+    @staticmethod
+    def _question(body: dict) -> str:
+        question = body.get("question") if isinstance(body, dict) else None
+        if not isinstance(question, str) or not question.strip():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object with a 'question' string")
+        return question.strip()
+
+    @staticmethod
+    def _library(body: dict) -> Optional[str]:
+        library = body.get("library")
+        if library is not None and (not isinstance(library, str) or not library.strip()):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'library' must be a library name")
+        return library.strip() if library else None
+
+    def route(self, method: str, path: str):
+        routes = {
+            ("GET", "/health"): self.health,
+            ("GET", "/metrics"): self.metrics,
+            ("POST", "/search"): self.search,
+            ("POST", "/ask"): self.ask,
+        }
+        handler = routes.get((method, path.split("?", 1)[0]))
+        if handler is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {method} {path}")
+        return handler
+
+    async def read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, dict, bytes]]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, path, version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = headers.get("content-length") or "0"
+        if not length.isdigit():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        length = int(length)
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        headers["_version"] = version
+        return method, path, headers, body
+
+    async def write_response(self, writer: asyncio.StreamWriter, status: HTTPStatus, payload, keep_alive: bool):
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            content_type = "application/json"
+        head = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == HTTPStatus.SERVICE_UNAVAILABLE:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await self.read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, raw_body = request
+                    keep_alive = (
+                        headers.get("connection", "").lower() != "close"
+                        and headers["_version"] == "HTTP/1.1"
+                    )
+                    handler = self.route(method, path)
+                    try:
+                        body = json.loads(raw_body) if raw_body else {}
+                    except json.JSONDecodeError:
+                        raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body is not valid JSON")
+
+                    if handler in (self.health, self.metrics):
+                        payload = await handler(body)
+                    else:
+                        if self.pending >= self.max_pending:
+                            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Server busy, try again later")
+                        self.pending += 1
+                        try:
+                            payload = await handler(body)
+                        finally:
+                            self.pending -= 1
+                    await self.write_response(writer, HTTPStatus.OK, payload, keep_alive)
+                except HTTPError as e:
+                    await self.write_response(writer, e.status, {"error": str(e)}, keep_alive)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    print(f"Error handling request: {str(e)}")
+                    await self.write_response(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}, False)
+                    break
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def serve_forever(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"\nJellySeek listening on http://{host}:{port} (POST /search, POST /ask, GET /health, GET /metrics)")
+        async with server:
+            await server.serve_forever()
+
+def serve(host: Optional[str] = None, port: Optional[int] = None):
+    """Open the collection once and serve queries until interrupted"""
+    _, _, _, collection = initialize_database()
+    if collection.count() == 0:
+        print("The database is empty, run jellyseek and /update first.")
+        return
+
+    server = QueryServer(collection)
+    try:
+        asyncio.run(server.serve_forever(host or SERVE_HOST, port or SERVE_PORT))
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        server.executor.shutdown(wait=False)
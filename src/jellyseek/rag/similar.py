@@ -0,0 +1,312 @@
+import os
+import pickle
+import re
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+from jellyseek.rag.config import CHROMADB_PATH, SIMILAR_TOP_K
+from jellyseek.rag.filters import slug
+from jellyseek.rag.keyword_index import file_version
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Rows of the similarity matrix computed at a time, bounds memory to BLOCK_ROWS x library size
+BLOCK_ROWS = 1024
+
+# "like" only compares when it follows a noun such as "movies" or "something",
+# "I would like it to be funny" is not asking for movies like It
+LIKE_RE = re.compile(
+    r"(?:\b(?:movies?|films?|shows?|series|something|anything|more|others?|titles?|ones?)"
+    r"(?:\s+(?:just|kind of|a bit|a lot|more))?\s+(?:like|such as)"
+    r"|\b(?:similar to|in the vein of|along the lines of|reminiscent of))\s+(.+)$"
+)
+# The title ends at punctuation, or before a word that starts a new clause.
+# Colons, periods and brackets stay, titles and "Alien (1979)" use them
+CLAUSE_END_RE = re.compile(r"[,;!?]|\s-\s")
+CLAUSE_WORDS = {
+    "and", "but", "or", "with", "without", "from", "for", "that", "which", "please",
+    "except", "only", "though", "although", "starring", "in", "on", "to", "so",
+}
+
+def title_key(title: str) -> str:
+    return slug(title)
+
+# numpy is imported where it is used, the chat loads this module before it needs a graph
+def normalize(vectors) -> "np.ndarray":
+    import numpy as np
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def top_k(scores: "np.ndarray", k: int) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Column indices and values of the k best scores in each row, best first"""
+    import numpy as np
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((len(scores), 0), dtype=np.int32), np.empty((len(scores), 0), dtype=np.float32)
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best, order, axis=1).astype(np.int32), np.take_along_axis(best_scores, order, axis=1)
+
+class SimilarityGraph:
+    """
+    Top-k nearest neighbours of every movie by embedding, plus a title lookup
+    so "movies like X" can be answered without searching or generating. The
+    normalized vectors are kept too, so an update only needs the embeddings
+    of the movies that changed.
+    """
+    def __init__(self, k: int = SIMILAR_TOP_K):
+        import numpy as np
+        self.k = k
+        self.ids: List[str] = []
+        self.neighbours = np.empty((0, k), dtype=np.int32)
+        self.scores = np.empty((0, k), dtype=np.float32)
+        self.vectors: Optional["np.ndarray"] = None
+        self.titles: Dict[str, List[str]] = {}
+        self._positions: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def build(self, ids: List[str], embeddings, metadatas: List[dict]):
+        """Compute every movie's neighbours in blocks of BLOCK_ROWS"""
+        import numpy as np
+        vectors = normalize(embeddings)
+        self.ids = list(ids)
+        self.neighbours, self.scores = self._neighbours_of(vectors, np.arange(len(ids)))
+        self.vectors = vectors
+        self._index_titles(metadatas)
+
+    def update(self, ids: List[str], metadatas: List[dict], changed: Iterable[str],
+               embeddings: Dict[str, Sequence[float]]):
+        """
+        Refresh the graph for a library where only the changed ids were added,
+        re-embedded or removed. embeddings holds the new vector of every id
+        that changed or that the graph has not seen, the others are reused.
+        Changed rows and rows that pointed at removed or changed movies are
+        recomputed, every other row only merges in the changed movies.
+        """
+        import numpy as np
+        changed = set(changed) | embeddings.keys()
+        old_rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        fresh = [row for row, doc_id in enumerate(ids) if doc_id in embeddings]
+        reused = [row for row, doc_id in enumerate(ids) if doc_id not in embeddings]
+        vectors = np.empty((len(ids), self.vectors.shape[1]), dtype=np.float32)
+        if fresh:
+            vectors[fresh] = normalize([embeddings[ids[row]] for row in fresh])
+        if reused:
+            vectors[reused] = self.vectors[[old_rows[ids[row]] for row in reused]]
+
+        position = {doc_id: i for i, doc_id in enumerate(ids)}
+        # Old row and neighbour numbers to the new ones, -1 for stale entries
+        mapping = np.array([
+            -1 if doc_id in changed else position.get(doc_id, -1) for doc_id in self.ids
+        ] + [-1], dtype=np.int64)
+        neighbours = np.full((len(ids), self.k), -1, dtype=np.int32)
+        scores = np.full((len(ids), self.k), -np.inf, dtype=np.float32)
+        dirty = np.ones(len(ids), dtype=bool)
+        for old_row, doc_id in enumerate(self.ids):
+            row = mapping[old_row]
+            if row < 0:
+                continue
+            translated = mapping[self.neighbours[old_row]]
+            if (translated >= 0).all() and len(translated) == self.k:
+                neighbours[row] = translated
+                scores[row] = self.scores[old_row]
+                dirty[row] = False
+
+        changed_rows = np.array(sorted(position[doc_id] for doc_id in changed if doc_id in position), dtype=np.int64)
+        clean = np.flatnonzero(~dirty)
+        if len(changed_rows) and len(clean):
+            # Let rows that stay valid pick up the changed movies
+            for start in range(0, len(clean), BLOCK_ROWS):
+                rows = clean[start:start + BLOCK_ROWS]
+                candidates = vectors[rows] @ vectors[changed_rows].T
+                candidates[rows[:, None] == changed_rows[None, :]] = -np.inf
+                merged_ids = np.concatenate([neighbours[rows], np.broadcast_to(changed_rows, candidates.shape)], axis=1)
+                merged_scores = np.concatenate([scores[rows], candidates], axis=1)
+                best, best_scores = top_k(merged_scores, self.k)
+                neighbours[rows] = np.take_along_axis(merged_ids, best, axis=1)
+                scores[rows] = best_scores
+
+        recompute = np.flatnonzero(dirty)
+        if len(recompute):
+            neighbours[recompute], scores[recompute] = self._neighbours_of(vectors, recompute)
+        self.ids, self.neighbours, self.scores, self.vectors = list(ids), neighbours, scores, vectors
+        self._index_titles(metadatas)
+
+    def _neighbours_of(self, vectors: "np.ndarray", rows: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+        import numpy as np
+        k = min(self.k, max(len(vectors) - 1, 0))
+        neighbours = np.full((len(rows), self.k), -1, dtype=np.int32)
+        scores = np.full((len(rows), self.k), -np.inf, dtype=np.float32)
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = rows[start:start + BLOCK_ROWS]
+            similarity = vectors[block] @ vectors.T
+            similarity[np.arange(len(block)), block] = -np.inf
+            best, best_scores = top_k(similarity, k)
+            neighbours[start:start + len(block), :k] = best
+            scores[start:start + len(block), :k] = best_scores
+        return neighbours, scores
+
+    def _index_titles(self, metadatas: List[dict]):
+        self._positions = None
+        self.titles = {}
+        for doc_id, metadata in zip(self.ids, metadatas):
+            title = (metadata or {}).get("title")
+            if not title:
+                continue
+            self.titles.setdefault(title_key(title), []).append(doc_id)
+            if year := metadata.get("year"):
+                self.titles.setdefault(title_key(f"{title} {year}"), []).append(doc_id)
+
+    def similar(self, doc_id: str, n: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Nearest movies to doc_id with their cosine similarity"""
+        if self._positions is None:
+            self._positions = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        row = self._positions.get(doc_id)
+        if row is None:
+            return []
+        return [
+            (self.ids[neighbour], float(score))
+            for neighbour, score in zip(self.neighbours[row][:n], self.scores[row][:n]) if neighbour >= 0
+        ]
+
+    def find_title(self, question: str) -> Optional[Tuple[str, str]]:
+        """
+        The movie a "movies like X" question refers to, as (matched text, id).
+        The longest run of words after "like" that names a known title and
+        reaches the end of its clause wins.
+        """
+        match = LIKE_RE.search(question.lower().strip())
+        if not match:
+            return None
+        clause = CLAUSE_END_RE.split(match.group(1), 1)[0].rstrip(". ")
+        words = title_key(clause).split("_")
+        for end in range(len(words), 0, -1):
+            if end < len(words) and words[end] not in CLAUSE_WORDS:
+                continue
+            ids = self.titles.get("_".join(words[:end]))
+            if ids:
+                return " ".join(words[:end]), ids[0]
+        return None
+
+    def save(self, path: str):
+        """Write the graph atomically next to the vector store files, the vectors go in a .npy beside it"""
+        import numpy as np
+        if self.vectors is not None:
+            with open(f"{vectors_path(path)}.tmp", "wb") as f:
+                np.save(f, self.vectors)
+            os.replace(f"{vectors_path(path)}.tmp", vectors_path(path))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(
+                {"k": self.k, "ids": self.ids, "neighbours": self.neighbours, "scores": self.scores, "titles": self.titles},
+                f, protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SimilarityGraph":
+        import numpy as np
+        graph = cls()
+        with open(path, "rb") as f:
+            graph.__dict__.update(pickle.load(f))
+        # Graphs saved without vectors, or with vectors of another version, can only be rebuilt
+        if os.path.exists(vectors_path(path)):
+            vectors = np.load(vectors_path(path), mmap_mode="r")
+            graph.vectors = vectors if len(vectors) == len(graph.ids) else None
+        return graph
+
+_graphs: Dict[str, Tuple[Optional[Tuple[int, int]], SimilarityGraph]] = {}
+_graphs_lock = threading.Lock()
+
+def similarity_graph_path(collection_name: str) -> str:
+    return os.path.join(CHROMADB_PATH, f"{collection_name}_similar.pkl")
+
+def vectors_path(graph_path: str) -> str:
+    return f"{os.path.splitext(graph_path)[0]}.npy"
+
+def get_similarity_graph(collection_name: str) -> SimilarityGraph:
+    """
+    Shared graph for a collection, loaded from disk on first use and again
+    whenever another process (an update or rebuild) replaces the file
+    """
+    path = similarity_graph_path(collection_name)
+    version = file_version(path)
+    with _graphs_lock:
+        cached = _graphs.get(collection_name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        graph = SimilarityGraph.load(path) if version is not None else SimilarityGraph()
+        _graphs[collection_name] = (version, graph)
+        return graph
+
+def save_similarity_graph(collection_name: str, graph: SimilarityGraph):
+    """Persist a graph and make it the shared one for the collection"""
+    path = similarity_graph_path(collection_name)
+    graph.save(path)
+    with _graphs_lock:
+        _graphs[collection_name] = (file_version(path), graph)
+
+def refresh_similarity_graph(collection, collection_name: str, changed: Optional[Iterable[str]] = None):
+    """
+    Rebuild the graph from the embeddings stored in the collection, or update
+    it when only the changed ids (new, re-embedded or removed) differ. An
+    update fetches just the embeddings of those ids and reuses the rest.
+    """
+    graph = get_similarity_graph(collection_name)
+    if changed is None or not len(graph) or graph.vectors is None:
+        stored = collection.get(include=["embeddings", "metadatas"])
+        if not stored["ids"]:
+            return
+        graph = SimilarityGraph()
+        graph.build(stored["ids"], stored["embeddings"], stored["metadatas"])
+    else:
+        stored = collection.get(include=["metadatas"])
+        if not stored["ids"]:
+            return
+        changed = set(changed)
+        known = set(graph.ids)
+        needed = [doc_id for doc_id in stored["ids"] if doc_id in changed or doc_id not in known]
+        embeddings = {}
+        if needed:
+            fresh = collection.get(ids=needed, include=["embeddings"])
+            embeddings = dict(zip(fresh["ids"], fresh["embeddings"]))
+        graph.update(stored["ids"], stored["metadatas"], changed, embeddings)
+    save_similarity_graph(collection_name, graph)
+
+def find_similar(collection, question: str) -> Optional[Tuple[str, List[str], List[str], List[dict]]]:
+    """
+    Answer "movies like X" from the graph: (title, ids, documents, metadatas)
+    of X's nearest neighbours, or None when the question names no known title.
+    """
+    graph = get_similarity_graph(collection.name)
+    if not len(graph):
+        return None
+    found = graph.find_title(question)
+    if not found:
+        return None
+    _, doc_id = found
+    neighbours = [neighbour for neighbour, _ in graph.similar(doc_id)]
+    results = collection.get(ids=[doc_id] + neighbours, include=["documents", "metadatas"])
+    by_id = dict(zip(results["ids"], zip(results["documents"], results["metadatas"])))
+    if doc_id not in by_id:
+        return None
+    neighbours = [neighbour for neighbour in neighbours if neighbour in by_id]
+    return (
+        by_id[doc_id][1].get("title", ""),
+        neighbours,
+        [by_id[neighbour][0] for neighbour in neighbours],
+        [by_id[neighbour][1] for neighbour in neighbours],
+    )
+
+def format_similar(title: str, metadatas: List[dict]) -> str:
+    """Plain list of recommendations, used when no explanation is generated"""
+    lines = [f"Movies similar to {title}:"]
+    for metadata in metadatas:
+        year = f" ({metadata['year']})" if metadata.get("year") else ""
+        genres = f" - {metadata['genres']}" if metadata.get("genres") else ""
+        lines.append(f"- {metadata.get('title', 'Unknown')}{year}{genres}")
+    return "\n".join(lines)
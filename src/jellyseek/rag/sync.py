@@ -0,0 +1,164 @@
+import contextvars
+import queue
+import sys
+import threading
+import time
+from typing import List, Optional
+from jellyseek.rag.config import AUTO_SYNC_INTERVAL
+
+# The sync whose output the current context prints. Thread pools the sync
+# starts submit their work through contextvars.copy_context().run, so their
+# threads inherit it and their output is collected too.
+sync_output: "contextvars.ContextVar[Optional[BackgroundSync]]" = contextvars.ContextVar("sync_output", default=None)
+
+def sync_library(full: bool = False, libraries: Optional[List[str]] = None) -> bool:
+    """
+    Export the library from Jellyfin and bring the vector database in line
+    with it. Library names limit an incremental sync to those libraries.
+    """
+    from jellyseek.jellyfin_export.main import sync_items
+    from jellyseek.rag.database import collection_count
+    from jellyseek.rag.db_generator import generate_database, update_database
+
+    try:
+        count, changed = sync_items(libraries=None if full else libraries)
+    except Exception as e:
+        print(f"Failed to fetch valid items from Jellyfin: {str(e)}")
+        return False
+
+    if not count:
+        print("No movies found in Jellyfin")
+        return False
+
+    # Nothing to do if Jellyfin is unchanged and the database already holds the export
+    if not full and not changed and collection_count() == count:
+        print(f"No changes in Jellyfin, {count} movies up to date.")
+        return True
+
+    print(f"Saved {count} items, syncing database...")
+    if full:
+        return bool(generate_database(force_update=True))
+    return bool(update_database(libraries))
+
+class _ThreadOutput:
+    """
+    Stand-in for sys.stdout that keeps output printed on behalf of the sync,
+    from its own thread or its worker pools, off the terminal. Lines it
+    prints are queued for the chat loop, carriage-return progress updates
+    only replace the current status.
+    """
+    def __init__(self, target, owner: "BackgroundSync"):
+        self._target = target
+        self._owner = owner
+        self._buffer = ""
+
+    def write(self, text):
+        if sync_output.get() is not self._owner:
+            return self._target.write(text)
+        self._buffer += text
+        while True:
+            cut = min((i for i in (self._buffer.find("\n"), self._buffer.find("\r")) if i >= 0), default=-1)
+            if cut < 0:
+                break
+            line, separator, self._buffer = self._buffer[:cut], self._buffer[cut], self._buffer[cut + 1:]
+            if line.strip():
+                self._owner.report(line.strip(), progress=separator == "\r")
+        return len(text)
+
+    def flush(self):
+        self._target.flush()
+
+    def __getattr__(self, attr):
+        return getattr(self._target, attr)
+
+class BackgroundSync:
+    """
+    Runs library syncs on a worker thread while the chat keeps answering from
+    the current collection. Only one sync runs at a time. Output is collected
+    and shown between prompts instead of being printed over the user's input.
+    """
+    def __init__(self, interval_minutes: float = AUTO_SYNC_INTERVAL):
+        self.interval = interval_minutes * 60
+        self.thread: Optional[threading.Thread] = None
+        self.status = "idle"
+        self.last_result: Optional[bool] = None
+        self.last_finished: Optional[float] = None
+        self._messages: "queue.Queue[str]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._timer: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def report(self, message: str, progress: bool = False):
+        """Record output from the sync, progress lines only update the status"""
+        self.status = message
+        if not progress:
+            self._messages.put(message)
+
+    def drain(self) -> List[str]:
+        """Messages the sync printed since the last call"""
+        messages = []
+        while True:
+            try:
+                messages.append(self._messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def start(self, full: bool = False, libraries: Optional[List[str]] = None) -> bool:
+        """Start a sync unless one is already running"""
+        with self._lock:
+            if self.running:
+                return False
+            if not isinstance(sys.stdout, _ThreadOutput):
+                sys.stdout = _ThreadOutput(sys.stdout, self)
+            self.status = "starting full rebuild" if full else "starting update"
+            self.thread = threading.Thread(target=self._run, args=(full, libraries), daemon=True, name="library-sync")
+            self.thread.start()
+            return True
+
+    def _run(self, full: bool, libraries: Optional[List[str]]):
+        sync_output.set(self)
+        try:
+            result = sync_library(full, libraries)
+        except Exception as e:
+            print(f"Library sync failed: {str(e)}")
+            result = False
+        self.last_result = result
+        self.last_finished = time.time()
+        self.status = "idle"
+        self._messages.put("Library sync finished." if result else "Library sync did not complete.")
+
+    def start_auto(self):
+        """Sync every AUTO_SYNC_INTERVAL minutes, skipping rounds while one is still running"""
+        if self.interval <= 0 or self._timer is not None:
+            return self
+        self._timer = threading.Thread(target=self._auto_loop, daemon=True, name="library-sync-timer")
+        self._timer.start()
+        return self
+
+    def _auto_loop(self):
+        while not self._stop.wait(self.interval):
+            self.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop scheduling syncs and wait for a running one to finish"""
+        self._stop.set()
+        thread = self.thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def describe(self) -> str:
+        """One-line summary for /status"""
+        if self.running:
+            state = f"Sync running: {self.status}"
+        elif self.last_finished is None:
+            state = "No sync has run this session"
+        else:
+            outcome = "succeeded" if self.last_result else "failed"
+            state = f"Last sync {outcome} at {time.strftime('%H:%M:%S', time.localtime(self.last_finished))}"
+        if self.interval > 0:
+            state += f" (auto-sync every {self.interval / 60:g} min)"
+        return state
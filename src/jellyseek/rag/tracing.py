@@ -0,0 +1,117 @@
+import contextlib
+import cProfile
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List
+from jellyseek.rag.config import TRACING_ENABLED, TRACE_WINDOW, PROFILE_DIR
+
+# Shared no-op context manager, so disabled tracing is a single function call
+_NULL_SPAN = contextlib.nullcontext()
+
+_samples: Dict[str, Deque[float]] = {}
+_totals: Dict[str, List[float]] = {}
+_lock = threading.Lock()
+_profile_lock = threading.Lock()
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+def span(name: str):
+    """Time a pipeline stage, e.g. `with span("vector_search"): ...`"""
+    if not TRACING_ENABLED:
+        return _NULL_SPAN
+    return _Span(name)
+
+def record(name: str, seconds: float):
+    """Record a stage duration measured elsewhere"""
+    if not TRACING_ENABLED:
+        return
+    with _lock:
+        samples = _samples.get(name)
+        if samples is None:
+            samples = _samples[name] = deque(maxlen=TRACE_WINDOW)
+            _totals[name] = [0, 0.0]
+        samples.append(seconds)
+        _totals[name][0] += 1
+        _totals[name][1] += seconds
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+def snapshot() -> Dict[str, dict]:
+    """Per-stage count, sum and p50/p95/p99 over the recent window"""
+    with _lock:
+        data = {name: (sorted(samples), list(_totals[name])) for name, samples in _samples.items()}
+    return {
+        name: {
+            "count": int(count),
+            "sum": total,
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+        }
+        for name, (values, (count, total)) in data.items()
+        if values
+    }
+
+def format_stats() -> str:
+    """Human readable latency table for the /stats command"""
+    stats = snapshot()
+    if not stats:
+        return "No timings recorded yet."
+    lines = [f"{'stage':<16}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}"]
+    for name, s in sorted(stats.items()):
+        lines.append(
+            f"{name:<16}{s['count']:>7}{s['p50'] * 1000:>8.1f}ms{s['p95'] * 1000:>8.1f}ms{s['p99'] * 1000:>8.1f}ms"
+        )
+    return "\n".join(lines)
+
+def export_prometheus() -> str:
+    """Timings in the Prometheus text exposition format, served at /metrics"""
+    lines = [
+        "# HELP jellyseek_stage_seconds Latency of JellySeek pipeline stages.",
+        "# TYPE jellyseek_stage_seconds summary",
+    ]
+    for name, s in sorted(snapshot().items()):
+        for key, quantile in (("p50", "0.5"), ("p95", "0.95"), ("p99", "0.99")):
+            lines.append(f'jellyseek_stage_seconds{{stage="{name}",quantile="{quantile}"}} {s[key]:.6f}')
+        lines.append(f'jellyseek_stage_seconds_sum{{stage="{name}"}} {s["sum"]:.6f}')
+        lines.append(f'jellyseek_stage_seconds_count{{stage="{name}"}} {s["count"]}')
+    return "\n".join(lines) + "\n"
+
+@contextlib.contextmanager
+def _profile(name: str):
+    # cProfile can only be active once per process, concurrent queries are not profiled
+    if not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        yield
+    finally:
+        profiler.disable()
+        _profile_lock.release()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**6}.prof"))
+
+def profiled(name: str):
+    """Capture a cProfile dump of the block into PROFILE_DIR when it is set"""
+    if not PROFILE_DIR:
+        return _NULL_SPAN
+    return _profile(name)
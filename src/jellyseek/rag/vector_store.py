@@ -0,0 +1,505 @@
+import os
+import pickle
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from jellyseek.rag.config import VECTOR_DTYPE, VECTOR_ANN_THRESHOLD, VECTOR_ANN_PROBES
+from jellyseek.rag.filters import matches_where
+
+CURRENT_FILE = "CURRENT"
+LOG_FILE = "log.pkl"
+# Rows converted to float32 at a time when scanning the matrix
+BLOCK_ROWS = 8192
+# Pending writes are folded into a new snapshot once they outnumber this or the snapshot itself
+MIN_COMPACT_ROWS = 1024
+IVF_SAMPLE_ROWS = 20000
+IVF_ITERATIONS = 8
+
+def normalize(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def quantize(vectors: np.ndarray, dtype: str):
+    """Normalized float32 rows to the stored dtype, with per-row scales for int8"""
+    if dtype == "int8" and not len(vectors):
+        return vectors.astype(np.int8), np.empty(0, dtype=np.float32)
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    return vectors.astype(np.float16), None
+
+def build_columns(metadatas: List[dict]) -> Dict[str, tuple]:
+    """
+    Metadata dicts to columns of (values, present). Booleans, integers and
+    floats become typed arrays, anything else an object array.
+    """
+    n = len(metadatas)
+    columns = {}
+    for key in set().union(*metadatas) if metadatas else ():
+        raw = [metadata.get(key) for metadata in metadatas]
+        present = np.fromiter((value is not None for value in raw), dtype=bool, count=n)
+        values = [value for value in raw if value is not None]
+        if all(isinstance(value, bool) for value in values):
+            array = np.array([bool(value) for value in raw], dtype=bool)
+        elif all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+            array = np.array([value or 0 for value in raw], dtype=np.int64)
+        elif all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+            array = np.array([np.nan if value is None else value for value in raw], dtype=np.float64)
+        else:
+            array = np.empty(n, dtype=object)
+            array[:] = raw
+        columns[key] = (array, present)
+    return columns
+
+def column_mask(column: Optional[tuple], operator: str, operand, n: int) -> np.ndarray:
+    """Rows of one column satisfying a where-clause operator"""
+    if column is None:
+        return np.zeros(n, dtype=bool)
+    values, present = column
+    try:
+        if operator == "$eq":
+            mask = values == operand
+        elif operator == "$ne":
+            mask = values != operand
+        elif operator == "$gt":
+            mask = values > operand
+        elif operator == "$gte":
+            mask = values >= operand
+        elif operator == "$lt":
+            mask = values < operand
+        elif operator == "$lte":
+            mask = values <= operand
+        elif operator == "$in":
+            mask = np.isin(values, list(operand))
+        elif operator == "$nin":
+            mask = ~np.isin(values, list(operand))
+        else:
+            raise ValueError(f"Unsupported where operator: {operator}")
+    except TypeError:
+        return np.zeros(n, dtype=bool)
+    return np.asarray(mask, dtype=bool) & present
+
+def where_mask(columns: Dict[str, tuple], where: Optional[dict], n: int) -> np.ndarray:
+    """Vectorized counterpart of filters.matches_where over columnar metadata"""
+    mask = np.ones(n, dtype=bool)
+    for key, condition in (where or {}).items():
+        if key == "$and":
+            for clause in condition:
+                mask &= where_mask(columns, clause, n)
+        elif key == "$or":
+            mask &= np.logical_or.reduce([where_mask(columns, clause, n) for clause in condition])
+        elif isinstance(condition, dict):
+            for operator, operand in condition.items():
+                mask &= column_mask(columns.get(key), operator, operand, n)
+        else:
+            mask &= column_mask(columns.get(key), "$eq", condition, n)
+    return mask
+
+class Snapshot:
+    """
+    One immutable, compacted state of a collection. Vectors, IDs and document
+    offsets are memory-mapped, so opening is cheap and processes reading the
+    same snapshot share it through the page cache. Metadata columns and the
+    IVF index are loaded on first use.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.ids = np.load(path / "ids.npy", mmap_mode="r")
+        self.vectors = np.load(path / "vectors.npy", mmap_mode="r")
+        self.scales = np.load(path / "scales.npy", mmap_mode="r") if (path / "scales.npy").exists() else None
+        self.offsets = np.load(path / "offsets.npy", mmap_mode="r")
+        docs = path / "documents.bin"
+        self.documents = np.memmap(docs, dtype=np.uint8, mode="r") if docs.stat().st_size else np.empty(0, np.uint8)
+        self._columns = None
+        self._rows = None
+        self._ivf = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def columns(self) -> Dict[str, tuple]:
+        if self._columns is None:
+            with open(self.path / "columns.pkl", "rb") as f:
+                self._columns = pickle.load(f)
+        return self._columns
+
+    @property
+    def rows(self) -> Dict[str, int]:
+        if self._rows is None:
+            self._rows = {doc_id: row for row, doc_id in enumerate(self.ids.tolist())}
+        return self._rows
+
+    @property
+    def ivf(self):
+        """(centroids, order, offsets) when the snapshot has an IVF index"""
+        if self._ivf is None and (self.path / "ivf_centroids.npy").exists():
+            self._ivf = tuple(
+                np.load(self.path / f"ivf_{part}.npy", mmap_mode="r") for part in ("centroids", "order", "offsets")
+            )
+        return self._ivf
+
+    def document(self, row: int) -> str:
+        return bytes(self.documents[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+    def metadata(self, row: int) -> dict:
+        return {
+            key: values[row].item() if isinstance(values[row], np.generic) else values[row]
+            for key, (values, present) in self.columns.items() if present[row]
+        }
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine similarity of the query with every row, or the given rows"""
+        if rows is not None:
+            block = np.asarray(self.vectors[rows], dtype=np.float32) @ query
+            return block * self.scales[rows] if self.scales is not None else block
+        out = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, len(self))
+            out[start:end] = np.asarray(self.vectors[start:end], dtype=np.float32) @ query
+            if self.scales is not None:
+                out[start:end] *= self.scales[start:end]
+        return out
+
+    @staticmethod
+    def write(path: Path, ids: List[str], vectors: np.ndarray, scales: Optional[np.ndarray],
+              documents: List[bytes], metadatas: List[dict]):
+        """Write a snapshot directory from already quantized rows"""
+        path.mkdir(parents=True)
+        np.save(path / "ids.npy", np.array(ids, dtype=str) if ids else np.empty(0, dtype="<U1"))
+        np.save(path / "vectors.npy", vectors)
+        if scales is not None:
+            np.save(path / "scales.npy", scales)
+        offsets = np.zeros(len(documents) + 1, dtype=np.int64)
+        np.cumsum([len(doc) for doc in documents], out=offsets[1:])
+        np.save(path / "offsets.npy", offsets)
+        with open(path / "documents.bin", "wb") as f:
+            f.write(b"".join(documents))
+        with open(path / "columns.pkl", "wb") as f:
+            pickle.dump(build_columns(metadatas), f, protocol=pickle.HIGHEST_PROTOCOL)
+        if VECTOR_ANN_THRESHOLD and len(ids) >= VECTOR_ANN_THRESHOLD:
+            build_ivf(path, vectors, scales)
+
+def dequantize(vectors, scales) -> np.ndarray:
+    block = np.asarray(vectors, dtype=np.float32)
+    return block * scales[:, None] if scales is not None else block
+
+def build_ivf(path: Path, vectors: np.ndarray, scales: Optional[np.ndarray]):
+    """Spherical k-means over a sample, then every row filed under its nearest centroid"""
+    n = len(vectors)
+    lists = int(np.sqrt(n))
+    rng = np.random.default_rng(0)
+    sample = np.sort(rng.choice(n, size=min(n, IVF_SAMPLE_ROWS), replace=False))
+    points = normalize(dequantize(vectors[sample], scales[sample] if scales is not None else None))
+    centroids = points[rng.choice(len(points), size=lists, replace=False)]
+    for _ in range(IVF_ITERATIONS):
+        assignment = np.argmax(points @ centroids.T, axis=1)
+        for i in range(lists):
+            members = points[assignment == i]
+            if len(members):
+                centroids[i] = members.mean(axis=0)
+        centroids = normalize(centroids)
+
+    assignment = np.empty(n, dtype=np.int32)
+    for start in range(0, n, BLOCK_ROWS):
+        end = min(start + BLOCK_ROWS, n)
+        block = dequantize(vectors[start:end], scales[start:end] if scales is not None else None)
+        assignment[start:end] = np.argmax(block @ centroids.T, axis=1)
+    order = np.argsort(assignment, kind="stable").astype(np.int32)
+    offsets = np.searchsorted(assignment[order], np.arange(lists + 1)).astype(np.int64)
+    np.save(path / "ivf_centroids.npy", centroids.astype(np.float32))
+    np.save(path / "ivf_order.npy", order)
+    np.save(path / "ivf_offsets.npy", offsets)
+
+class NumpyCollection:
+    """
+    A collection answering the subset of the Chroma collection API JellySeek
+    uses. The current snapshot is memory-mapped and writes made since then
+    are kept in memory and appended to a log next to it; once they grow past
+    the snapshot they are compacted into a new one. Other processes pick up
+    new snapshots and log entries on their next call. One process should
+    write to a collection at a time.
+    """
+    def __init__(self, path: Path, name: str, embedding_function=None):
+        self.path = path
+        self.name = name
+        self._embedding_function = embedding_function
+        self._lock = threading.RLock()
+        self._current = None
+        self._snapshot: Optional[Snapshot] = None
+        self._log_offset = 0
+        self._pending: Dict[str, tuple] = {}
+        self._hidden = np.zeros(0, dtype=bool)
+        self._refresh()
+
+    # -- state -----------------------------------------------------------
+
+    def _snapshot_name(self) -> str:
+        return (self.path / CURRENT_FILE).read_text().strip()
+
+    def _refresh(self):
+        """Follow compactions and writes made by other collection objects or processes"""
+        with self._lock:
+            try:
+                current = self._snapshot_name()
+            except FileNotFoundError:
+                raise ValueError(f"Collection {self.name} does not exist.")
+            if current != self._current:
+                self._current = current
+                self._snapshot = Snapshot(self.path / current)
+                self._log_offset = 0
+                self._pending = {}
+                self._hidden = np.zeros(len(self._snapshot), dtype=bool)
+            self._replay()
+
+    def _replay(self):
+        log_path = self.path / self._current / LOG_FILE
+        try:
+            if log_path.stat().st_size <= self._log_offset:
+                return
+        except FileNotFoundError:
+            return
+        with open(log_path, "rb") as f:
+            f.seek(self._log_offset)
+            while True:
+                try:
+                    operation, payload = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError):
+                    # End of the log, or a record that is still being written
+                    break
+                self._apply(operation, payload)
+                self._log_offset = f.tell()
+
+    def _apply(self, operation: str, payload):
+        rows = self._snapshot.rows
+        if operation == "upsert":
+            for doc_id, vector, document, metadata in payload:
+                self._pending[doc_id] = (vector, document, metadata)
+                if doc_id in rows:
+                    self._hidden[rows[doc_id]] = True
+        elif operation == "delete":
+            for doc_id in payload:
+                self._pending.pop(doc_id, None)
+                if doc_id in rows:
+                    self._hidden[rows[doc_id]] = True
+
+    def _write(self, operation: str, payload):
+        with self._lock:
+            self._refresh()
+            with open(self.path / self._current / LOG_FILE, "ab") as f:
+                pickle.dump((operation, payload), f, protocol=pickle.HIGHEST_PROTOCOL)
+                self._log_offset = f.tell()
+            self._apply(operation, payload)
+            if len(self._pending) + int(self._hidden.sum()) > max(MIN_COMPACT_ROWS, len(self._snapshot)):
+                self.compact()
+
+    def compact(self):
+        """Fold pending writes into a new snapshot and switch to it"""
+        with self._lock:
+            snapshot = self._snapshot
+            live = np.flatnonzero(~self._hidden)
+            ids = snapshot.ids[live].tolist() + list(self._pending)
+            documents = [bytes(snapshot.documents[snapshot.offsets[row]:snapshot.offsets[row + 1]]) for row in live]
+            documents += [document.encode("utf-8") for _, document, _ in self._pending.values()]
+            metadatas = [snapshot.metadata(row) for row in live] + [metadata for _, _, metadata in self._pending.values()]
+
+            pending_vectors = [vector for vector, _, _ in self._pending.values()]
+            dim = len(pending_vectors[0]) if pending_vectors else snapshot.vectors.shape[1] if len(snapshot) else 0
+            new_vectors, new_scales = quantize(np.array(pending_vectors, dtype=np.float32).reshape(len(pending_vectors), dim), VECTOR_DTYPE)
+            if len(live) and snapshot.vectors.dtype == new_vectors.dtype:
+                vectors = np.concatenate([snapshot.vectors[live], new_vectors])
+                scales = np.concatenate([snapshot.scales[live], new_scales]) if new_scales is not None else None
+            elif len(live):
+                # Stored with another dtype, requantize
+                old_vectors, old_scales = quantize(
+                    dequantize(snapshot.vectors[live], snapshot.scales[live] if snapshot.scales is not None else None),
+                    VECTOR_DTYPE
+                )
+                vectors = np.concatenate([old_vectors, new_vectors])
+                scales = np.concatenate([old_scales, new_scales]) if new_scales is not None else None
+            else:
+                vectors, scales = new_vectors, new_scales
+
+            name = f"snapshot-{uuid.uuid4().hex}"
+            Snapshot.write(self.path / name, ids, vectors, scales, documents, metadatas)
+            write_current(self.path, name)
+            # Keep the previous snapshot for readers that are still on it
+            previous = self._current
+            for entry in self.path.iterdir():
+                if entry.is_dir() and entry.name not in (name, previous):
+                    shutil.rmtree(entry, ignore_errors=True)
+            self._refresh()
+
+    # -- Chroma API subset ---------------------------------------------
+
+    def count(self) -> int:
+        self._refresh()
+        with self._lock:
+            return len(self._snapshot) - int(self._hidden.sum()) + len(self._pending)
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None):
+        if embeddings is None:
+            embeddings = self._embedding_function(documents)
+        vectors = normalize(embeddings)
+        documents = documents or [""] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        self._write("upsert", list(zip(ids, vectors, documents, metadatas)))
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None):
+        self.upsert(ids, embeddings, documents, metadatas)
+
+    def delete(self, ids=None):
+        self._write("delete", list(ids or []))
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents")):
+        self._refresh()
+        with self._lock:
+            snapshot = self._snapshot
+            # Each entry is (id, snapshot row or None, pending entry or None)
+            if ids is not None:
+                entries = []
+                for doc_id in ids:
+                    if doc_id in self._pending:
+                        pending = self._pending[doc_id]
+                        if matches_where(pending[2], where):
+                            entries.append((doc_id, None, pending))
+                    elif (row := snapshot.rows.get(doc_id)) is not None and not self._hidden[row]:
+                        if matches_where(snapshot.metadata(row), where):
+                            entries.append((doc_id, row, None))
+            else:
+                rows = np.flatnonzero(where_mask(snapshot.columns, where, len(snapshot)) & ~self._hidden)
+                entries = [(doc_id, row, None) for doc_id, row in zip(snapshot.ids[rows].tolist(), rows)]
+                entries += [
+                    (doc_id, None, pending) for doc_id, pending in self._pending.items()
+                    if matches_where(pending[2], where)
+                ]
+
+            result = {"ids": [doc_id for doc_id, _, _ in entries]}
+            if "documents" in include:
+                result["documents"] = [
+                    pending[1] if pending else snapshot.document(row) for _, row, pending in entries
+                ]
+            if "metadatas" in include:
+                result["metadatas"] = [
+                    pending[2] if pending else snapshot.metadata(row) for _, row, pending in entries
+                ]
+            if "embeddings" in include:
+                rows = [row for _, row, pending in entries if not pending]
+                stored = iter(dequantize(
+                    snapshot.vectors[rows], snapshot.scales[rows] if snapshot.scales is not None else None
+                ) if rows else [])
+                result["embeddings"] = [pending[0] if pending else next(stored) for _, _, pending in entries]
+            return result
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10, where=None,
+              include=("metadatas", "documents", "distances")):
+        if query_embeddings is None:
+            query_embeddings = self._embedding_function(query_texts)
+        self._refresh()
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            for query in normalize(query_embeddings):
+                ids, documents, metadatas, distances = self._search(query, n_results, where)
+                results["ids"].append(ids)
+                results["documents"].append(documents)
+                results["metadatas"].append(metadatas)
+                results["distances"].append(distances)
+        return results
+
+    def _search(self, query: np.ndarray, n_results: int, where: Optional[dict]):
+        snapshot = self._snapshot
+        candidates = []
+        if len(snapshot):
+            rows, scores = self._search_snapshot(query, n_results, where)
+            candidates += [
+                (float(score), doc_id, lambda row=row: snapshot.document(row), lambda row=row: snapshot.metadata(row))
+                for doc_id, row, score in zip(snapshot.ids[rows].tolist(), rows, scores)
+            ]
+        if self._pending:
+            pending = [(doc_id, entry) for doc_id, entry in self._pending.items() if matches_where(entry[2], where)]
+            if pending:
+                scores = np.stack([entry[0] for _, entry in pending]) @ query
+                candidates += [
+                    (float(score), doc_id, lambda document=entry[1]: document, lambda metadata=entry[2]: metadata)
+                    for (doc_id, entry), score in zip(pending, scores)
+                ]
+        candidates.sort(key=lambda candidate: -candidate[0])
+        top = candidates[:n_results]
+        return (
+            [doc_id for _, doc_id, _, _ in top],
+            [document() for _, _, document, _ in top],
+            [metadata() for _, _, _, metadata in top],
+            [1 - score for score, _, _, _ in top],
+        )
+
+    def _search_snapshot(self, query: np.ndarray, n_results: int, where: Optional[dict]):
+        """Best snapshot rows, scanning only the nearest IVF lists when there is an index"""
+        snapshot = self._snapshot
+        allowed = ~self._hidden
+        if where:
+            allowed &= where_mask(snapshot.columns, where, len(snapshot))
+
+        if snapshot.ivf is not None:
+            centroids, order, offsets = snapshot.ivf
+            probes = np.argsort(-(centroids @ query))[:VECTOR_ANN_PROBES]
+            rows = np.concatenate([order[offsets[i]:offsets[i + 1]] for i in probes])
+            rows = np.sort(rows[allowed[rows]])
+            # Too few matches near the query, scan everything instead
+            if len(rows) >= n_results:
+                scores = snapshot.scores(query, rows)
+                best = np.argsort(-scores)[:n_results]
+                return rows[best], scores[best]
+
+        scores = snapshot.scores(query)
+        scores[~allowed] = -np.inf
+        k = min(n_results, int(allowed.sum()))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return best, scores[best]
+
+def write_current(path: Path, snapshot_name: str):
+    tmp = path / f"{CURRENT_FILE}.tmp"
+    tmp.write_text(snapshot_name)
+    os.replace(tmp, path / CURRENT_FILE)
+
+class NumpyClient:
+    """Stand-in for chromadb.PersistentClient storing each collection in its own directory"""
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _collection_path(self, name: str) -> Path:
+        return self.path / name
+
+    def get_collection(self, name: str, embedding_function=None) -> NumpyCollection:
+        return NumpyCollection(self._collection_path(name), name, embedding_function)
+
+    def create_collection(self, name: str, metadata: dict = None, embedding_function=None) -> NumpyCollection:
+        path = self._collection_path(name)
+        if (path / CURRENT_FILE).exists():
+            raise ValueError(f"Collection {name} already exists.")
+        snapshot_name = f"snapshot-{uuid.uuid4().hex}"
+        Snapshot.write(path / snapshot_name, [], np.empty((0, 0), dtype=np.float16), None, [], [])
+        write_current(path, snapshot_name)
+        return NumpyCollection(path, name, embedding_function)
+
+    def get_or_create_collection(self, name: str, embedding_function=None, metadata: dict = None) -> NumpyCollection:
+        try:
+            return self.get_collection(name, embedding_function)
+        except ValueError:
+            return self.create_collection(name, metadata, embedding_function)
+
+    def delete_collection(self, name: str):
+        path = self._collection_path(name)
+        if not (path / CURRENT_FILE).exists():
+            raise ValueError(f"Collection {name} does not exist.")
+        shutil.rmtree(path)
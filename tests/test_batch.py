@@ -0,0 +1,47 @@
+import json
+from types import SimpleNamespace
+import pytest
+from jellyseek.rag import batch
+
+class FakeCollection:
+    def count(self):
+        return 1
+
+def fake_answer(collection, question):
+    if question == "boom":
+        raise RuntimeError("generation failed")
+    retrieval = SimpleNamespace(search_query=question.upper(), ids=["m1"])
+    return SimpleNamespace(text=f"answer to {question}", retrieval=retrieval, timings={"search": 0.0})
+
+@pytest.fixture(autouse=True)
+def fake_pipeline(monkeypatch):
+    monkeypatch.setattr(batch, "initialize_database", lambda: (None, "movies", None, FakeCollection()))
+    monkeypatch.setattr(batch, "answer_query", fake_answer)
+
+def write_input(tmp_path, lines):
+    path = tmp_path / "questions.jsonl"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+def test_results_go_to_stdout_in_order(tmp_path, capsys):
+    source = write_input(tmp_path, ['"hello"', '{"id": "q2", "question": "world"}', '"boom"'])
+    batch.run_batch(source, "-", workers=2)
+
+    captured = capsys.readouterr()
+    results = [json.loads(line) for line in captured.out.splitlines()]
+    assert [result["id"] for result in results] == [1, "q2", 3]
+    assert results[0]["answer"] == "answer to hello"
+    assert results[1]["search_query"] == "WORLD"
+    assert results[2]["answer"] is None and results[2]["error"] == "generation failed"
+    assert "Answered 2/3 questions" in captured.err
+
+def test_malformed_lines_are_skipped(tmp_path, capsys):
+    source = write_input(tmp_path, ['"hello"', '{bad', '{"id": 7}', '"world"'])
+    output = tmp_path / "answers.jsonl"
+    batch.run_batch(source, str(output), workers=1)
+
+    results = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert [result["question"] for result in results] == ["hello", "world"]
+    err = capsys.readouterr().err
+    assert "Skipping line 2: invalid JSON" in err
+    assert "Skipping line 3: no question found" in err
@@ -0,0 +1,66 @@
+import pytest
+from jellyseek.rag.filters import extract_filters, genre_hints, matches_where, restrict
+
+def decade(start):
+    return [{"year": {"$gte": start}}, {"year": {"$lte": start + 9}}]
+
+@pytest.mark.parametrize("question, expected", [
+    ("1980s horror movies", {"$and": decade(1980) + [{"genre_horror": {"$eq": True}}]}),
+    ("horror from the 90s", {"$and": decade(1990) + [{"genre_horror": {"$eq": True}}]}),
+    ("'70s classics", {"$and": decade(1970)}),
+    ("80s horror movies", {"$and": decade(1980) + [{"genre_horror": {"$eq": True}}]}),
+    ("sci-fi movies from 2010", {"$and": [{"year": {"$eq": 2010}}, {"genre_science_fiction": {"$eq": True}}]}),
+    ("comedies under 90 minutes", {"$and": [
+        {"genre_comedy": {"$eq": True}}, {"runtime_minutes": {"$gt": 0}}, {"runtime_minutes": {"$lte": 90}}
+    ]}),
+    ("movies longer than 2 hours", {"runtime_minutes": {"$gte": 120}}),
+    ("rated R thrillers", {"$and": [{"genre_thriller": {"$eq": True}}, {"official_rating": {"$eq": "R"}}]}),
+    ("tv shows about cooking", {"item_type": {"$eq": "Series"}}),
+    ("shows to binge", {"item_type": {"$eq": "Series"}}),
+    # Wording that only looks like a filter
+    ("in my 30s, what should I watch", None),
+    ("movies from the Alien series", None),
+    ("the harry potter series", None),
+    ("heist movies", None),
+    ("something to watch", None),
+])
+def test_extract_filters(question, expected):
+    assert extract_filters(question) == expected
+
+@pytest.mark.parametrize("question, expected", [
+    ("heist movies", ["Crime"]),
+    ("something scary", ["Horror"]),
+    ("1980s horror movies", []),
+])
+def test_genre_hints(question, expected):
+    assert genre_hints(question) == expected
+
+@pytest.mark.parametrize("where, metadata, expected", [
+    (None, {"year": 1999}, True),
+    ({"year": {"$eq": 1999}}, {"year": 1999}, True),
+    ({"$and": decade(1980)}, {"year": 1999}, False),
+    ({"runtime_minutes": {"$lte": 90}}, {"year": 1999}, False),
+    ({"official_rating": {"$in": ["R", "PG-13"]}}, {"official_rating": "R"}, True),
+])
+def test_matches_where(where, metadata, expected):
+    assert matches_where(metadata, where) is expected
+
+@pytest.mark.parametrize("question, expected", [
+    ("comedies in my kids library", {"$and": [{"genre_comedy": {"$eq": True}}, {"library": {"$eq": "Kids"}}]}),
+    ("anything from the Kids Movies collection", {"library": {"$eq": "Kids Movies"}}),
+    ("movies for kids", None),
+    ("what's in the Anime library", None),
+])
+def test_extract_library_filter(question, expected):
+    assert extract_filters(question, ["Movies", "Kids", "Kids Movies"]) == expected
+
+@pytest.mark.parametrize("where, condition, expected", [
+    (None, None, None),
+    (None, {"library": "A"}, {"library": "A"}),
+    ({"year": 1999}, None, {"year": 1999}),
+    ({"year": 1999}, {"library": "A"}, {"$and": [{"year": 1999}, {"library": "A"}]}),
+    ({"$and": [{"year": 1999}, {"genre_drama": True}]}, {"library": "A"},
+     {"$and": [{"year": 1999}, {"genre_drama": True}, {"library": "A"}]}),
+])
+def test_restrict(where, condition, expected):
+    assert restrict(where, condition) == expected
@@ -0,0 +1,40 @@
+import pytest
+from jellyseek.rag.llm import Conversation
+from jellyseek.rag.pipeline import is_follow_up, retrieve_follow_up
+
+def conversation() -> Conversation:
+    conversation = Conversation()
+    conversation.remember(
+        ["m1", "m2"],
+        ["Title: Alien", "Title: Airplane!"],
+        [{"title": "Alien", "genre_horror": True, "runtime_minutes": 117},
+         {"title": "Airplane!", "genre_comedy": True, "runtime_minutes": 88}],
+        "space horror"
+    )
+    return conversation
+
+@pytest.mark.parametrize("question, expected", [
+    ("and only the ones under 2 hours", True),
+    ("which of those are comedies", True),
+    ("any of them rated R?", True),
+    ("what about something newer", True),
+    ("which one is the longest?", True),
+    ("the last samurai", False),
+    ("that one movie with tom hanks", False),
+    ("comedies instead of horror", False),
+    ("what is the name of the movie", False),
+])
+def test_is_follow_up(question, expected):
+    assert is_follow_up(question, conversation()) is expected
+
+def test_no_follow_up_without_earlier_movies():
+    assert not is_follow_up("which of those are comedies", Conversation())
+
+def test_follow_up_narrows_previous_movies():
+    retrieval = retrieve_follow_up("which of those are comedies", conversation())
+    assert retrieval.ids == ["m2"]
+    assert retrieval.search_query == "space horror"
+
+def test_follow_up_without_matches_is_empty():
+    retrieval = retrieve_follow_up("which of those are westerns", conversation())
+    assert retrieval.ids == [] and retrieval.documents == []
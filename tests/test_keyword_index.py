@@ -0,0 +1,58 @@
+import os
+from jellyseek.rag import keyword_index
+from jellyseek.rag.keyword_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+def make_index() -> BM25Index:
+    index = BM25Index()
+    index.add("alien", "Title: Alien\nPlot: A crew in space is hunted by an alien creature")
+    index.add("heat", "Title: Heat\nPlot: A detective hunts a crew of bank robbers in Los Angeles")
+    index.add("amelie", "Title: Amélie\nPlot: A shy waitress in Paris changes the lives of those around her")
+    return index
+
+def test_tokenize_folds_case_and_accents():
+    assert tokenize("Amélie, PARIS!") == ["amelie", "paris"]
+
+def test_search_ranks_matching_documents():
+    index = make_index()
+    assert [doc_id for doc_id, _ in index.search("alien space creature")][0] == "alien"
+    assert [doc_id for doc_id, _ in index.search("amelie")] == ["amelie"]
+    assert index.search("zombie") == []
+
+def test_search_limits_results():
+    assert len(make_index().search("crew", n_results=1)) == 1
+
+def test_add_replaces_and_remove_forgets():
+    index = make_index()
+    index.add("heat", "Title: Heat\nPlot: A wildfire spreads through a small town")
+    assert [doc_id for doc_id, _ in index.search("robbers")] == []
+    index.remove("alien")
+    assert len(index) == 2
+    assert index.search("alien") == []
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "index.pkl")
+    index = make_index()
+    index.save(path)
+    assert BM25Index.load(path).search("waitress paris") == index.search("waitress paris")
+
+def test_get_keyword_index_reloads_replaced_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(keyword_index, "CHROMADB_PATH", str(tmp_path))
+    monkeypatch.setattr(keyword_index, "_indexes", {})
+    assert len(keyword_index.get_keyword_index("movies")) == 0
+
+    # Another process writes the file, the cached empty index must be dropped
+    make_index().save(keyword_index.keyword_index_path("movies"))
+    assert len(keyword_index.get_keyword_index("movies")) == 3
+
+    index = keyword_index.get_keyword_index("movies")
+    index.remove("heat")
+    keyword_index.save_keyword_index("movies", index)
+    assert keyword_index.get_keyword_index("movies") is index
+    os.remove(keyword_index.keyword_index_path("movies"))
+    assert len(keyword_index.get_keyword_index("movies")) == 0
+
+def test_reciprocal_rank_fusion():
+    # b ranks high in the first two lists, d only appears in one
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"], ["d"]]) == ["b", "a", "c", "d"]
+    assert reciprocal_rank_fusion([["a"], []]) == ["a"]
+    assert reciprocal_rank_fusion([]) == []
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from jellyseek.rag import similar
+from jellyseek.rag.similar import SimilarityGraph, get_similarity_graph, refresh_similarity_graph
+from jellyseek.rag.vector_store import NumpyClient
+
+def library(count, seed=0):
+    ids = [f"m{i}" for i in range(count)]
+    embeddings = np.random.default_rng(seed).normal(size=(count, 8)).astype(np.float32)
+    metadatas = [{"title": f"Movie {i}", "year": 2000 + i % 20} for i in range(count)]
+    return ids, embeddings, metadatas
+
+def test_update_matches_full_build():
+    ids, embeddings, metadatas = library(300)
+    graph = SimilarityGraph(k=5)
+    graph.build(ids, embeddings, metadatas)
+
+    # Drop some movies, re-embed some and add new ones
+    rng = np.random.default_rng(1)
+    embeddings = embeddings.copy()
+    embeddings[10:20] = rng.normal(size=(10, 8))
+    new_ids = ids[5:] + ["n0", "n1"]
+    new_embeddings = np.concatenate([embeddings[5:], rng.normal(size=(2, 8)).astype(np.float32)])
+    new_metadatas = metadatas[5:] + [{"title": "New 0"}, {"title": "New 1"}]
+    changed = ids[:5] + ids[10:20] + ["n0", "n1"]
+    fresh = {doc_id: new_embeddings[new_ids.index(doc_id)] for doc_id in changed if doc_id in new_ids}
+    graph.update(new_ids, new_metadatas, changed, fresh)
+
+    expected = SimilarityGraph(k=5)
+    expected.build(new_ids, new_embeddings, new_metadatas)
+    assert graph.ids == expected.ids
+    assert (graph.neighbours == expected.neighbours).all()
+    assert np.allclose(graph.scores, expected.scores, atol=1e-5)
+
+def title_graph() -> SimilarityGraph:
+    titles = ["It", "Heat", "Alien", "Aliens", "Mr. Smith Goes to Washington", "Mission: Impossible"]
+    ids = [f"m{i}" for i in range(len(titles))]
+    embeddings = np.random.default_rng(0).normal(size=(len(titles), 8))
+    graph = SimilarityGraph(k=3)
+    graph.build(ids, embeddings, [{"title": title, "year": 1979} for title in titles])
+    return graph
+
+@pytest.mark.parametrize("question, expected", [
+    ("movies like Heat", ("heat", "m1")),
+    ("Something like Alien please?", ("alien", "m2")),
+    ("films similar to aliens, but funnier", ("aliens", "m3")),
+    ("anything in the vein of Alien (1979)", ("alien 1979", "m2")),
+    ("movies like Mr. Smith Goes to Washington", ("mr smith goes to washington", "m4")),
+    ("shows like Mission: Impossible with more heists", ("mission impossible", "m5")),
+    ("more like it", ("it", "m0")),
+])
+def test_find_title(question, expected):
+    assert title_graph().find_title(question) == expected
+
+@pytest.mark.parametrize("question", [
+    "I would like it to be funny",
+    "I like heat waves, recommend a summer movie",
+    "movies like heat waves",
+    "something like Unknown Film",
+    "comedies from 2001",
+])
+def test_find_title_ignores_non_comparisons(question):
+    assert title_graph().find_title(question) is None
+
+def test_refresh_fetches_only_changed_embeddings(tmp_path, monkeypatch):
+    monkeypatch.setattr(similar, "CHROMADB_PATH", str(tmp_path))
+    monkeypatch.setattr(similar, "_graphs", {})
+    collection = NumpyClient(str(tmp_path / "numpy")).create_collection("movies")
+    ids, embeddings, metadatas = library(50)
+    collection.upsert(ids=ids, embeddings=embeddings.tolist(), metadatas=metadatas)
+    refresh_similarity_graph(collection, "movies")
+
+    fetched = []
+    get = collection.get
+    def recording_get(ids=None, where=None, include=("metadatas", "documents")):
+        if "embeddings" in include:
+            fetched.append(None if ids is None else list(ids))
+        return get(ids=ids, where=where, include=include)
+    monkeypatch.setattr(collection, "get", recording_get)
+
+    collection.upsert(ids=["new"], embeddings=embeddings[:1].tolist(), metadatas=[{"title": "New"}])
+    collection.delete(ids=["m3"])
+    refresh_similarity_graph(collection, "movies", ["new", "m3"])
+    assert fetched == [["new"]]
+    graph = get_similarity_graph("movies")
+    assert len(graph) == 50
+    assert graph.similar("new", 1)[0][0] == "m0"
+
+def test_graph_reloads_when_replaced(tmp_path, monkeypatch):
+    monkeypatch.setattr(similar, "CHROMADB_PATH", str(tmp_path))
+    monkeypatch.setattr(similar, "_graphs", {})
+    assert len(get_similarity_graph("movies")) == 0
+
+    ids, embeddings, metadatas = library(20)
+    graph = SimilarityGraph(k=3)
+    graph.build(ids, embeddings, metadatas)
+    # Saved by another process, the cached empty graph must be dropped
+    graph.save(similar.similarity_graph_path("movies"))
+    loaded = get_similarity_graph("movies")
+    assert len(loaded) == 20
+    assert loaded.vectors is not None and loaded.similar("m1") == graph.similar("m1")
@@ -0,0 +1,108 @@
+import pytest
+from jellyseek.jellyfin_export import snapshot
+from jellyseek.jellyfin_export.snapshot import (
+    Snapshot, diff_snapshots, iter_snapshot, rollback_snapshot, snapshot_history, write_snapshot
+)
+
+def make_items(count, start=0, name="Movie"):
+    return [
+        {"Id": f"id{i}", "Name": f"{name} {i}", "Genres": ["Drama"], "Overview": "x" * 40, "UserData": {"Played": True}}
+        for i in range(start, start + count)
+    ]
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    # Several blocks even for a handful of items
+    monkeypatch.setattr(snapshot, "BLOCK_RECORDS", 4)
+
+def test_write_and_read_back(tmp_path):
+    path = tmp_path / "movies.jsnap"
+    items = make_items(10)
+    assert write_snapshot(items, path) == 10
+
+    expected = [snapshot.trim_item(item) for item in items]
+    assert "UserData" not in expected[0]
+    assert list(iter_snapshot(path)) == expected
+    with Snapshot(path) as snap:
+        assert len(snap) == 10
+        assert len(snap.blocks) == 3
+        assert snap.ids == [item["Id"] for item in items]
+        assert list(snap) == expected
+
+def test_empty_write_keeps_previous_file_unless_allowed(tmp_path):
+    path = tmp_path / "movies.jsnap"
+    write_snapshot(make_items(3), path)
+    assert write_snapshot([], path) == 0
+    assert len(list(iter_snapshot(path))) == 3
+
+    assert write_snapshot([], path, allow_empty=True) == 0
+    assert list(iter_snapshot(path)) == []
+    with Snapshot(path) as snap:
+        assert len(snap) == 0 and list(snap) == []
+
+def test_diff(tmp_path):
+    old, new = tmp_path / "old.jsnap", tmp_path / "new.jsnap"
+    write_snapshot(make_items(5), old)
+    items = make_items(4, start=1)
+    items[0]["Name"] = "Renamed"
+    items.append(make_items(1, start=7)[0])
+    write_snapshot(items, new)
+
+    added, removed, changed = diff_snapshots(old, new)
+    assert added == {"id7"}
+    assert removed == {"id0"}
+    assert changed == {"id1"}
+
+def test_history_and_rollback(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "JELLYFIN_SNAPSHOT_HISTORY", 2)
+    path = tmp_path / "movies.jsnap"
+    for version in range(3):
+        write_snapshot(make_items(2, name=f"v{version}"), path)
+    history = snapshot_history(path)
+    assert len(history) == 2
+    assert list(iter_snapshot(history[0]))[0]["Name"] == "v1 0"
+
+    restored = rollback_snapshot(path)
+    assert restored == history[0]
+    assert list(iter_snapshot(path))[0]["Name"] == "v1 0"
+    # The snapshot that was replaced went into the history
+    assert list(iter_snapshot(snapshot_history(path)[0]))[0]["Name"] == "v2 0"
+
+    with pytest.raises(ValueError):
+        rollback_snapshot(path, steps=5)
+
+@pytest.mark.parametrize("keep", [3, 12, 40, -30, -1])
+def test_truncated_snapshot_raises_value_error(tmp_path, keep):
+    path = tmp_path / "movies.jsnap"
+    write_snapshot(make_items(10), path)
+    data = path.read_bytes()
+    truncated = tmp_path / "truncated.jsnap"
+    truncated.write_bytes(data[:keep] if keep > 0 else data[:len(data) + keep])
+
+    with pytest.raises(ValueError, match="Truncated snapshot"):
+        Snapshot(truncated)
+    if keep > 0:
+        # Cut inside the header or the blocks, the stream reader must notice as well
+        with pytest.raises(ValueError, match="Truncated snapshot"):
+            list(iter_snapshot(truncated))
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / "movies.jsnap"
+    path.write_bytes(b"{\"Items\": []}")
+    with pytest.raises(ValueError, match="Not a library snapshot"):
+        list(iter_snapshot(path))
+
+def test_rollback_library_keeps_incremental_sync(tmp_path, monkeypatch):
+    from jellyseek.jellyfin_export import main
+    monkeypatch.setattr(main, "validate_config", lambda: str(tmp_path))
+    path = main.library_file(tmp_path, "Movies")
+    write_snapshot(make_items(3), path)
+    write_snapshot(make_items(5), path)
+    main.save_sync_state({"libraries": {"lib1": {"name": "Movies", "count": 5, "last_sync": "2026-01-01T00:00:00Z"}}})
+
+    main.rollback_library("movies")
+    assert len(list(iter_snapshot(path))) == 3
+    state = main.load_sync_state()["libraries"]["lib1"]
+    # The next sync must not export over the restored snapshot
+    assert state["last_sync"] == "2026-01-01T00:00:00Z"
+    assert state["count"] == 3
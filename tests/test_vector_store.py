@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+from jellyseek.rag import vector_store
+from jellyseek.rag.vector_store import NumpyClient
+
+DIM = 8
+
+def vectors(count, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, DIM)).astype(np.float32)
+
+def metadata(i):
+    return {"title": f"Movie {i}", "year": 1980 + i % 30, "genre_horror": i % 3 == 0}
+
+@pytest.fixture
+def collection(tmp_path):
+    return NumpyClient(str(tmp_path)).create_collection("movies")
+
+def fill(collection, count=40):
+    ids = [f"m{i}" for i in range(count)]
+    embeddings = vectors(count)
+    collection.upsert(
+        ids=ids, embeddings=embeddings.tolist(),
+        documents=[f"doc {i}" for i in range(count)], metadatas=[metadata(i) for i in range(count)]
+    )
+    return ids, embeddings
+
+def check_round_trip(collection, ids, embeddings):
+    assert collection.count() == len(ids)
+    stored = collection.get(ids=ids[:5], include=["documents", "metadatas", "embeddings"])
+    assert stored["ids"] == ids[:5]
+    assert stored["documents"] == [f"doc {i}" for i in range(5)]
+    assert stored["metadatas"] == [metadata(i) for i in range(5)]
+    expected = embeddings[:5] / np.linalg.norm(embeddings[:5], axis=1, keepdims=True)
+    assert np.allclose(np.array(stored["embeddings"], dtype=np.float32), expected, atol=2e-2)
+
+    # Each vector is its own nearest neighbour
+    results = collection.query(query_embeddings=embeddings[:3].tolist(), n_results=2)
+    assert [found[0] for found in results["ids"]] == ids[:3]
+    assert all(distance < 1e-2 for distance in (found[0] for found in results["distances"]))
+
+def test_pending_writes_round_trip(collection):
+    ids, embeddings = fill(collection)
+    check_round_trip(collection, ids, embeddings)
+
+def test_compacted_round_trip(collection):
+    ids, embeddings = fill(collection)
+    collection.compact()
+    check_round_trip(collection, ids, embeddings)
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_quantized_snapshot(collection, monkeypatch, dtype):
+    monkeypatch.setattr(vector_store, "VECTOR_DTYPE", dtype)
+    ids, embeddings = fill(collection)
+    collection.compact()
+    check_round_trip(collection, ids, embeddings)
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_upsert_replaces_and_delete_removes(collection, compact):
+    ids, _ = fill(collection)
+    if compact:
+        collection.compact()
+    collection.upsert(ids=["m1"], embeddings=vectors(1, seed=1).tolist(), documents=["new"], metadatas=[{"title": "New"}])
+    collection.delete(ids=["m2", "missing"])
+
+    assert collection.count() == len(ids) - 1
+    stored = collection.get(ids=["m1", "m2", "m3"])
+    assert stored["ids"] == ["m1", "m3"]
+    assert stored["documents"] == ["new", "doc 3"]
+    assert "m2" not in collection.get()["ids"]
+    assert collection.query(query_embeddings=vectors(1, seed=1).tolist(), n_results=1)["ids"] == [["m1"]]
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_where_filters(collection, compact):
+    ids, embeddings = fill(collection)
+    if compact:
+        collection.compact()
+    where = {"$and": [{"genre_horror": {"$eq": True}}, {"year": {"$gte": 1990}}]}
+    expected = {f"m{i}" for i in range(40) if metadata(i)["genre_horror"] and metadata(i)["year"] >= 1990}
+
+    assert set(collection.get(where=where)["ids"]) == expected
+    assert collection.get(ids=["m0", "m12"], where=where)["ids"] == ["m12"]
+    found = collection.query(query_embeddings=embeddings[:1].tolist(), n_results=40, where=where)["ids"][0]
+    assert set(found) == expected
+
+def test_other_clients_see_writes(tmp_path, collection):
+    ids, embeddings = fill(collection)
+    reader = NumpyClient(str(tmp_path)).get_collection("movies")
+    check_round_trip(reader, ids, embeddings)
+
+    collection.compact()
+    collection.delete(ids=["m0"])
+    assert reader.count() == len(ids) - 1
+    assert reader.get(ids=["m0"])["ids"] == []
+
+def test_ivf_search_finds_exact_matches(collection, monkeypatch):
+    monkeypatch.setattr(vector_store, "VECTOR_ANN_THRESHOLD", 100)
+    ids = [f"m{i}" for i in range(400)]
+    embeddings = vectors(400)
+    collection.upsert(ids=ids, embeddings=embeddings.tolist(), metadatas=[metadata(i) for i in range(400)])
+    collection.compact()
+    assert collection._snapshot.ivf is not None
+    results = collection.query(query_embeddings=embeddings[:10].tolist(), n_results=1)
+    assert [found[0] for found in results["ids"]] == ids[:10]
+
+def test_client_collections(tmp_path):
+    client = NumpyClient(str(tmp_path))
+    with pytest.raises(ValueError):
+        client.get_collection("movies")
+    client.create_collection("movies")
+    with pytest.raises(ValueError):
+        client.create_collection("movies")
+    assert client.get_or_create_collection("movies").count() == 0
+    client.delete_collection("movies")
+    with pytest.raises(ValueError):
+        client.get_collection("movies")